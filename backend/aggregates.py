@@ -0,0 +1,217 @@
+"""
+Running prediction aggregates.
+
+Counters are updated once per prediction so /metrics, /health and the
+periodic performance report cost the same no matter how many predictions
+have been served.
+
+Request threads update their own shard of the counters, each behind its
+own lock, so concurrent predictions do not contend on one lock. Readers
+merge the shards into an immutable AggregateSnapshot. Each shard is
+copied consistently under its own lock, so per-class and per-method counts
+sum to the total. The shards are copied one after another, though, so a
+snapshot taken during concurrent writes is not a single point in time. It
+may include a prediction from one shard and miss an earlier one from a
+shard already copied. A reset takes every shard lock at once and is
+therefore atomic.
+"""
+
+import itertools
+import threading
+from collections import deque
+
+FEATURE_NAMES = ('name', 'name_manufacturer', 'classification', 'implanted')
+
+
+class SpaceSaving:
+    """Approximate top-K value counts in fixed memory (Space-Saving algorithm)"""
+
+    def __init__(self, capacity=50):
+        self.capacity = capacity
+        self.counts = {}
+
+    def add(self, value, count=1):
+        counts = self.counts
+        if value in counts:
+            counts[value] += count
+        elif len(counts) < self.capacity:
+            counts[value] = count
+        else:
+            # Replace the smallest counter; its count becomes the new value's error bound
+            smallest = min(counts, key=counts.get)
+            counts[value] = counts.pop(smallest) + count
+
+    def top(self, k):
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class _Shard:
+    """Counters updated by one group of threads"""
+
+    __slots__ = ('lock', 'total', 'confidence_sum', 'prediction_counts', 'method_counts',
+                 'feature_counts', 'recent')
+
+    def __init__(self, top_k_capacity, recent_size):
+        self.lock = threading.Lock()
+        self.clear(top_k_capacity, recent_size)
+
+    def clear(self, top_k_capacity, recent_size):
+        self.total = 0
+        self.confidence_sum = 0.0
+        self.prediction_counts = {}
+        self.method_counts = {}
+        self.feature_counts = {feature: SpaceSaving(top_k_capacity) for feature in FEATURE_NAMES}
+        # (sequence number, confidence), so shards can be merged back into arrival order
+        self.recent = deque(maxlen=recent_size)
+
+
+class AggregateSnapshot:
+    """Read-only view of the counters; each shard's contribution is consistent, the shards are not"""
+
+    def __init__(self, aggregates, total, confidence_sum, prediction_counts, method_counts, recent_confidences):
+        self.total = total
+        self.confidence_sum = confidence_sum
+        self.prediction_counts = prediction_counts
+        self.method_counts = method_counts
+        self.recent_confidences = recent_confidences
+        self._aggregates = aggregates
+
+    @property
+    def average_confidence(self):
+        return self.confidence_sum / self.total if self.total else 0.0
+
+    @property
+    def recent_average_confidence(self):
+        if not self.recent_confidences:
+            return 0.0
+        return sum(self.recent_confidences) / len(self.recent_confidences)
+
+    def top_feature_values(self, k=3):
+        # Merged only when asked for (the performance report), and read at that moment
+        return self._aggregates.top_feature_values(k)
+
+
+class PredictionAggregates:
+    """Per-class, per-method and per-feature counters plus a recent window, sharded by thread"""
+
+    def __init__(self, top_k_capacity=50, recent_size=10, shards=16):
+        self.top_k_capacity = top_k_capacity
+        self.recent_size = recent_size
+        self._shards = [_Shard(top_k_capacity, recent_size) for _ in range(max(1, shards))]
+        self._local = threading.local()
+        self._next_shard = itertools.count()
+        self._sequence = itertools.count()
+        # Bumped by every reset; add() drops records stored before the latest reset
+        self.epoch = 0
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = self._shards[next(self._next_shard) % len(self._shards)]
+        return shard
+
+    def _lock_all(self):
+        # Always in the same order, so concurrent resets and snapshots cannot deadlock
+        for shard in self._shards:
+            shard.lock.acquire()
+
+    def _unlock_all(self):
+        for shard in reversed(self._shards):
+            shard.lock.release()
+
+    def reset(self):
+        """Zero every counter atomically"""
+        self._lock_all()
+        try:
+            self.epoch += 1
+            for shard in self._shards:
+                shard.clear(self.top_k_capacity, self.recent_size)
+        finally:
+            self._unlock_all()
+
+    def add(self, record, epoch=None):
+        """Fold one PredictionRecord into the calling thread's shard.
+
+        epoch is the value of self.epoch when the record was stored; the
+        record is dropped if a reset happened since.
+        """
+        self.add_many((record,), epoch)
+
+    def add_many(self, records, epoch=None):
+        """Fold PredictionRecords stored together into the calling thread's shard, under one lock"""
+        shard = self._shard()
+        with shard.lock:
+            if epoch is not None and epoch != self.epoch:
+                return
+            prediction_counts = shard.prediction_counts
+            method_counts = shard.method_counts
+            feature_counts = [(feature, shard.feature_counts[feature]) for feature in FEATURE_NAMES]
+            for record in records:
+                shard.total += 1
+                shard.confidence_sum += record.confidence
+                prediction_counts[record.prediction] = prediction_counts.get(record.prediction, 0) + 1
+                method_counts[record.method] = method_counts.get(record.method, 0) + 1
+                for feature, counts in feature_counts:
+                    counts.add(getattr(record, feature))
+                shard.recent.append((next(self._sequence), record.confidence))
+
+    def seed(self, total, confidence_sum, prediction_counts, method_counts, feature_counts, recent_records):
+        """Replace the counters, atomically, with totals computed over stored history"""
+        self._lock_all()
+        try:
+            self.epoch += 1
+            for shard in self._shards:
+                shard.clear(self.top_k_capacity, self.recent_size)
+            shard = self._shards[0]
+            shard.total = total
+            shard.confidence_sum = confidence_sum
+            shard.prediction_counts = dict(prediction_counts)
+            shard.method_counts = dict(method_counts)
+            for feature, value_counts in feature_counts.items():
+                for value, count in value_counts:
+                    shard.feature_counts[feature].add(value, count)
+            # Negative sequence numbers sort before anything added later
+            shard.recent.extend((i - len(recent_records), record.confidence)
+                                for i, record in enumerate(recent_records))
+        finally:
+            self._unlock_all()
+
+    def top_feature_values(self, k=3):
+        """Most common values per feature across all shards"""
+        merged = {feature: {} for feature in FEATURE_NAMES}
+        for shard in self._shards:
+            with shard.lock:
+                shard_counts = {feature: list(counter.counts.items())
+                                for feature, counter in shard.feature_counts.items()}
+            for feature, value_counts in shard_counts.items():
+                # Summed Space-Saving counts still never underestimate a value
+                counts = merged[feature]
+                for value, count in value_counts:
+                    counts[value] = counts.get(value, 0) + count
+        return {feature: sorted(counts.items(), key=lambda item: item[1], reverse=True)[:k]
+                for feature, counts in merged.items()}
+
+    def snapshot(self):
+        """Merge the shards' counters into an AggregateSnapshot"""
+        total = 0
+        confidence_sum = 0.0
+        prediction_counts = {}
+        method_counts = {}
+        recent = []
+        for shard in self._shards:
+            # Each shard is copied under its lock; writers only ever wait for one copy
+            with shard.lock:
+                if not shard.total:
+                    continue
+                total += shard.total
+                confidence_sum += shard.confidence_sum
+                shard_predictions = list(shard.prediction_counts.items())
+                shard_methods = list(shard.method_counts.items())
+                recent.extend(shard.recent)
+            for prediction, count in shard_predictions:
+                prediction_counts[prediction] = prediction_counts.get(prediction, 0) + count
+            for method, count in shard_methods:
+                method_counts[method] = method_counts.get(method, 0) + count
+        recent.sort()
+        recent_confidences = [confidence for _, confidence in recent[-self.recent_size:]]
+        return AggregateSnapshot(self, total, confidence_sum, prediction_counts, method_counts, recent_confidences)
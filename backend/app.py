@@ -1,93 +1,309 @@
-from flask import Flask, request, jsonify
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
-import pandas as pd
-import pickle
 import numpy as np
-from sklearn.preprocessing import LabelEncoder
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, classification_report, confusion_matrix
 import os
-import sys
 import logging
+import random
 from datetime import datetime
-import json
+import csv
+import io
 import warnings
+from artifacts import TARGET_COLUMN, find_startup_artifact, load_known_devices, load_mapped_artifact, load_startup_artifact, name_manufacturer_pair_counts
+from batching import MicroBatcher
+from bulk_score import score_frame
+from cache import PredictionCache
+from feature_store import Vocabulary, vocabularies_from_dataframe
+from history import PredictionHistory
+from jobs import JobManager, UploadTooLarge
+from known_devices import KnownDeviceIndex
+from monitoring import DriftMonitor, build_reference, find_reference, load_reference, parse_windows
+from inference import MODEL_METHOD, InferenceModel, boost_confidences, find_model_path, load_model
+from prediction_logging import setup_logging
+from prometheus import CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE, LOAD_BUCKETS, REQUEST_BUCKETS, Registry, process_rss_bytes
+from reloading import FileWatcher, ModelReloader
+from rules import match_rule, simple_rule_based_prediction
+from serialization import DEVICE_SCHEMA, NDJSON_MIMETYPES, OrjsonProvider, ValidationError, dumps, loads, read_body
+from shadow import ShadowScorer
+from suggest import SuggestIndex
+from timing import clear_timer, current_timer, server_timing_header, stage, start_timer
 warnings.filterwarnings('ignore')
 
+# pandas and catboost are imported lazily where they are needed,
+# so importing this module stays cheap. Per-phase timings are shown on /health.
+startup_timings = {'imports': time.perf_counter() - _import_started}
+startup_mode = None
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)  # orjson for every response, MessagePack on request
 CORS(app)  # Enable CORS for all routes
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('prediction_log.txt'),
-        logging.StreamHandler(sys.stdout)
-    ]
+# Configure logging: records are queued and written by a background thread.
+# PREDICTION_LOG_LEVEL=DEBUG adds probabilities, model debug output and the
+# banner reports; WARNING turns per-prediction lines off.
+# PREDICTION_LOG_SAMPLE_RATE logs only that fraction of predictions.
+prediction_logger = setup_logging(
+    'prediction_log.txt',
+    level=os.environ.get('PREDICTION_LOG_LEVEL', 'INFO')
 )
+PREDICTION_LOG_SAMPLE_RATE = float(os.environ.get('PREDICTION_LOG_SAMPLE_RATE', 1.0))
 logger = logging.getLogger(__name__)
 
 # Global variables for model and encoders
 model = None
+inference_model = None  # single-pass wrapper around model, see inference.py
+model_path = None
+model_version = 0  # bumped on every (re)load; part of the prediction cache key
+shadow_scorer = None  # candidate model scored against a sample of live traffic
+drift_monitor = None  # sliding-window distributions and drift against the training data
+model_watcher = None
 encoders = {}
 target_encoder = None
-df = None
-prediction_history = []
+suggest_index = None
+known_devices = None  # recall levels observed in the dataset per exact feature tuple
+
+# Recent predictions stay in memory, everything is persisted to SQLite
+prediction_history = PredictionHistory(
+    os.environ.get('PREDICTION_HISTORY_DB', 'prediction_history.db'),
+    ring_size=int(os.environ.get('PREDICTION_HISTORY_RING_SIZE', 1000)),
+    # Set by serve.py when several worker processes write the same store
+    shared=os.environ.get('PREDICTION_HISTORY_SHARED') == '1'
+)
+
+# Model input columns, in the order the CatBoost model was trained on
+FEATURE_COLUMNS = ['name', 'name_manufacturer', 'classification', 'implanted']
+
+# Upper bound on rows accepted by /predict/batch in one request
+MAX_BATCH_ROWS = int(os.environ.get('PREDICT_BATCH_MAX_ROWS', 100000))
+
+# Cache of model predictions keyed on the normalized feature tuple
+prediction_cache = PredictionCache(
+    max_size=int(os.environ.get('PREDICTION_CACHE_SIZE', 10000)),
+    ttl_seconds=float(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+)
+
+# Upper bound on suggestions returned by /suggest/*
+SUGGEST_MAX_LIMIT = 100
+
+# Page sizes for /classification_summary
+SUMMARY_DEFAULT_LIMIT = 100
+SUMMARY_MAX_LIMIT = 1000
+SUMMARY_FIELDS = ['id', 'timestamp', 'device_name', 'manufacturer', 'classification',
+                  'implanted', 'predicted_class', 'confidence', 'method']
+
+# Hot reload: MODEL_WATCH_INTERVAL > 0 polls the model file every that many
+# seconds; ADMIN_TOKEN, when set, is required in X-Admin-Token on /admin/*
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', 0))
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Shadow scoring of live traffic with a candidate model (off the request thread)
+SHADOW_MODEL_PATH = os.environ.get('SHADOW_MODEL_PATH')
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', 0.1))
+
+# Sliding windows for /monitoring, each a ring of MONITORING_BUCKETS time buckets
+MONITORING_WINDOWS = parse_windows(os.environ.get('MONITORING_WINDOWS', '1m,5m,1h'))
+MONITORING_BUCKETS = int(os.environ.get('MONITORING_BUCKETS', 60))
+
+# Asynchronous scoring jobs (/jobs) for uploads too large for /predict/batch
+JOBS_DIR = os.environ.get('JOBS_DIR', 'jobs')
+JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 1))
+JOBS_CHUNKSIZE = int(os.environ.get('JOBS_CHUNKSIZE', 10000))
+JOBS_MAX_UPLOAD_BYTES = int(os.environ.get('JOBS_MAX_UPLOAD_MB', 1024)) * 1024 * 1024
+
+# Known-device lookup: /predict answers devices seen in the dataset from their
+# observed recall levels. KNOWN_DEVICE_LOOKUP=1 makes it the default; a request
+# can opt in or out with ?lookup=1 / ?lookup=0
+KNOWN_DEVICE_LOOKUP = os.environ.get('KNOWN_DEVICE_LOOKUP', '0') == '1'
+KNOWN_DEVICE_MIN_SUPPORT = int(os.environ.get('KNOWN_DEVICE_MIN_SUPPORT', 1))
+
+# Micro-batching of concurrent /predict calls into one model call
+MICROBATCH_ENABLED = os.environ.get('MICROBATCH_ENABLED', '1') == '1'
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get('MICROBATCH_MAX_WAIT_MS', 2))
+MICROBATCH_MAX_BATCH_SIZE = int(os.environ.get('MICROBATCH_MAX_BATCH_SIZE', 32))
+
+# Prometheus metrics for /metrics/prom (per worker process)
+metrics_registry = Registry()
+stage_seconds = metrics_registry.histogram(
+    'safeintel_stage_duration_seconds', 'Time spent in each request stage', ['stage'])
+request_seconds = metrics_registry.histogram(
+    'safeintel_request_duration_seconds', 'Request latency by endpoint', ['endpoint'], REQUEST_BUCKETS)
+model_load_seconds = metrics_registry.histogram(
+    'safeintel_model_load_duration_seconds', 'Duration of load_model_and_data()', buckets=LOAD_BUCKETS)
+model_errors = metrics_registry.counter(
+    'safeintel_model_errors_total', 'Model calls that raised or returned unusable rows', ['path'])
+rule_based_fallbacks = metrics_registry.counter(
+    'safeintel_rule_based_fallbacks_total', 'Predictions answered by simple_rule_based_prediction', ['reason'])
+metrics_registry.callback(
+    'safeintel_prediction_cache_hits_total', 'Prediction cache hits',
+    lambda: prediction_cache.hits, type_name='counter')
+metrics_registry.callback(
+    'safeintel_prediction_cache_misses_total', 'Prediction cache misses',
+    lambda: prediction_cache.misses, type_name='counter')
+metrics_registry.callback(
+    'safeintel_prediction_cache_entries', 'Entries in the prediction cache',
+    lambda: prediction_cache.stats()['size'])
+metrics_registry.callback(
+    'safeintel_prediction_history_records', 'Predictions in the history store',
+    lambda: len(prediction_history))
+metrics_registry.callback(
+    'safeintel_prediction_history_db_bytes', 'Size of the prediction history database and its WAL file',
+    lambda: sum(os.path.getsize(path) for path in (prediction_history.db_path, prediction_history.db_path + '-wal')
+                if os.path.exists(path)))
+metrics_registry.callback(
+    'safeintel_startup_phase_seconds', 'Duration of each phase of the last model load',
+    lambda: dict(startup_timings), ['phase'])
+metrics_registry.callback(
+    'safeintel_model_loaded', 'Whether the CatBoost model is loaded (1) or rule-based prediction is used (0)',
+    lambda: int(model is not None))
+metrics_registry.callback(
+    'safeintel_model_version', 'Incremented on every model load or hot swap',
+    lambda: model_version)
+metrics_registry.callback(
+    'safeintel_model_reloads_total', 'Hot model reloads by result',
+    lambda: {'ok': model_reloader.reloads, 'failed': model_reloader.failures}, ['result'], type_name='counter')
+shadow_comparisons = metrics_registry.counter(
+    'safeintel_shadow_comparisons_total', 'Shadow-scored predictions by agreement with the live model', ['result'])
+shadow_seconds = metrics_registry.histogram(
+    'safeintel_shadow_duration_seconds', 'Candidate model latency for shadow-scored rows')
+metrics_registry.callback(
+    'safeintel_shadow_dropped_total', 'Shadow samples dropped because the shadow queue was full',
+    lambda: shadow_scorer.dropped if shadow_scorer is not None else None, type_name='counter')
+metrics_registry.callback(
+    'safeintel_jobs_total', 'Scoring jobs finished by this process, by result',
+    lambda: {'complete': job_manager.jobs_completed, 'failed': job_manager.jobs_failed}, ['result'], type_name='counter')
+metrics_registry.callback(
+    'safeintel_job_worker_errors_total', 'Job runs that failed before scoring started and were left for a rescan',
+    lambda: job_manager.worker_errors, type_name='counter')
+metrics_registry.callback(
+    'safeintel_job_rows_scored_total', 'Rows scored by background jobs',
+    lambda: job_manager.rows_scored, type_name='counter')
+metrics_registry.callback(
+    'safeintel_known_device_lookups_total', 'Known-device lookups by /predict, by result',
+    lambda: {'hit': known_devices.hits, 'miss': known_devices.misses} if known_devices is not None else None,
+    ['result'], type_name='counter')
+metrics_registry.callback(
+    'safeintel_known_device_saved_seconds_total', 'Estimated model time avoided by known-device hits',
+    lambda: (known_devices.stats()['estimated_saved_ms'] or 0.0) / 1000 if known_devices is not None else None,
+    type_name='counter')
+
+def drift_psi_by_window():
+    """{(window, feature): PSI} for Prometheus; the predicted class is reported as 'predicted_class'"""
+    if drift_monitor is None:
+        return None
+    values = {}
+    for window, stats in drift_monitor.report()['windows'].items():
+        values[(window, 'predicted_class')] = stats['classes']['psi']
+        for feature, feature_stats in stats['features'].items():
+            values[(window, feature)] = feature_stats['psi']
+    return {labels: psi for labels, psi in values.items() if psi is not None}
+
+metrics_registry.callback(
+    'safeintel_drift_psi', 'Population stability index of live traffic against the training data',
+    drift_psi_by_window, ['window', 'feature'])
+metrics_registry.callback(
+    'safeintel_window_confidence_mean', 'Average prediction confidence per sliding window',
+    lambda: {window: stats['confidence']['mean'] for window, stats in drift_monitor.report()['windows'].items()
+             if stats['confidence']['mean'] is not None} if drift_monitor is not None else None, ['window'])
+metrics_registry.callback(
+    'process_resident_memory_bytes', 'Resident memory size in bytes',
+    process_rss_bytes)
+
+def record_startup_phase(phase, started):
+    """Store how long a startup phase took, in seconds"""
+    startup_timings[phase] = time.perf_counter() - started
 
 def load_model_and_data():
-    global model, encoders, target_encoder, df
+    global model, inference_model, model_path, model_version, model_watcher
+    global encoders, target_encoder, startup_mode, suggest_index, drift_monitor, known_devices
     
     try:
-        # Load the dataset
-        dataset_path = os.path.join('dataset', 'master_v5.csv')
-        if not os.path.exists(dataset_path):
-            dataset_path = os.path.join('..', 'dataset', 'master_v2.csv')
-        df = pd.read_csv(dataset_path)
-        print(f"Dataset loaded: {len(df)} rows")
+        load_started = time.perf_counter()
+        artifact_path = find_startup_artifact()
+        reference_path = find_reference(artifact_path)
+        reference = load_reference(reference_path) if reference_path is not None else None
         
-        # Create label encoders for categorical features
-        categorical_features = ['name', 'name_manufacturer', 'classification', 'implanted']
+        if artifact_path is not None and os.path.isdir(artifact_path):
+            # Fastest path: arrays from artifacts.py --mapped, memory-mapped rather than
+            # read, so workers share the pages and nothing is rebuilt per value
+            phase_started = time.perf_counter()
+            encoders, target_encoder, suggest_index = load_mapped_artifact(artifact_path)
+            pair_counts = None
+            record_startup_phase('encoders', phase_started)
+            startup_mode = 'mapped'
+            print(f"Mapped startup artifact opened from {artifact_path}: {len(encoders)} encoders")
+        elif artifact_path is not None:
+            # Fast path: vocabularies precomputed by artifacts.py, no CSV parse
+            phase_started = time.perf_counter()
+            encoders, target_encoder, pair_counts = load_startup_artifact(artifact_path)
+            record_startup_phase('encoders', phase_started)
+            startup_mode = 'artifact'
+            print(f"Startup artifact loaded from {artifact_path}: {len(encoders)} encoders")
+        else:
+            import pandas as pd
+            startup_mode = 'csv'
+            
+            # Load the dataset: only the model features and the target are read
+            phase_started = time.perf_counter()
+            dataset_path = os.path.join('dataset', 'master_v5.csv')
+            if not os.path.exists(dataset_path):
+                dataset_path = os.path.join('..', 'dataset', 'master_v2.csv')
+            df = pd.read_csv(dataset_path, usecols=lambda column: column in FEATURE_COLUMNS or column == TARGET_COLUMN)
+            record_startup_phase('dataset', phase_started)
+            print(f"Dataset loaded: {len(df)} rows")
+            
+            # Sorted vocabularies of the categorical features (the classes LabelEncoder would fit)
+            phase_started = time.perf_counter()
+            encoders = vocabularies_from_dataframe(df, FEATURE_COLUMNS)
+            for feature, vocabulary in encoders.items():
+                print(f"Encoder created for {feature}: {len(vocabulary)} classes")
+            
+            # Create encoder for target variable if it exists
+            if TARGET_COLUMN in df.columns:
+                target_encoder = Vocabulary(np.unique(df[TARGET_COLUMN].fillna('Unknown').astype(str)))
+                print(f"Target encoder created: {len(target_encoder.classes_)} classes")
+            record_startup_phase('encoders', phase_started)
+            
+            pair_counts = None
+            if 'name' in df.columns and 'name_manufacturer' in df.columns:
+                pair_counts = name_manufacturer_pair_counts(df)
+            reference = build_reference(df, FEATURE_COLUMNS, TARGET_COLUMN)
+            
+            phase_started = time.perf_counter()
+            known_devices = (KnownDeviceIndex.from_dataframe(df, FEATURE_COLUMNS, TARGET_COLUMN, KNOWN_DEVICE_MIN_SUPPORT)
+                             if TARGET_COLUMN in df.columns else None)
+            record_startup_phase('known_devices', phase_started)
+            
+            # Nothing else needs the DataFrame once the codes are built
+            del df
         
-        for feature in categorical_features:
-            if feature in df.columns:
-                encoders[feature] = LabelEncoder()
-                # Handle NaN values by converting to string
-                encoders[feature].fit(df[feature].fillna('Unknown').astype(str))
-                print(f"Encoder created for {feature}: {len(encoders[feature].classes_)} classes")
+        if artifact_path is not None:
+            phase_started = time.perf_counter()
+            known_devices = load_known_devices(artifact_path, KNOWN_DEVICE_MIN_SUPPORT)
+            record_startup_phase('known_devices', phase_started)
+        if known_devices is not None:
+            print(f"Known-device index: {len(known_devices)} distinct devices")
+        else:
+            print("No known-device index found (rebuild the startup artifact); lookups are disabled")
         
-        # Create encoder for target variable if it exists
-        if 'final_recall_level' in df.columns:
-            target_encoder = LabelEncoder()
-            target_encoder.fit(df['final_recall_level'].fillna('Unknown').astype(str))
-            print(f"Target encoder created: {len(target_encoder.classes_)} classes")
+        # Typeahead index over device names and manufacturers
+        if pair_counts is not None:
+            phase_started = time.perf_counter()
+            suggest_index = SuggestIndex(pair_counts)
+            record_startup_phase('suggest_index', phase_started)
+            print(f"Suggest index built: {len(suggest_index.names)} names, {len(suggest_index.manufacturers)} manufacturers")
         
         # Try to load the model
-        model_path = os.path.join('model', 'catboost_model.pkl')
-        if not os.path.exists(model_path):
-            model_path = os.path.join('..', 'model', 'catboost_model.pkl')
-        if not os.path.exists(model_path):
-            model_path = os.path.join('..', 'ml', 'catboost_model_3.pkl')
+        phase_started = time.perf_counter()
+        model_path = find_model_path()
         
-        if os.path.exists(model_path):
+        if model_path is not None:
             try:
-                from catboost import CatBoostClassifier
-                
-                # Try to load as native CatBoost format first
-                try:
-                    model = CatBoostClassifier()
-                    model.load_model(model_path)
-                    print(f"CatBoost model loaded successfully from {model_path} (native format)")
-                except Exception as native_error:
-                    print(f"Native format failed: {native_error}")
-                    # Try to load as pickle file
-                    try:
-                        with open(model_path, 'rb') as f:
-                            model = pickle.load(f)
-                        print(f"CatBoost model loaded successfully from {model_path} (pickle format)")
-                    except Exception as pickle_error:
-                        print(f"Pickle format also failed: {pickle_error}")
-                        raise Exception("Both native and pickle formats failed")
-                
+                import_started = time.perf_counter()
+                import catboost  # noqa: F401
+                record_startup_phase('catboost_import', import_started)
+                model = load_model(model_path)
             except Exception as e:
                 print(f"Error loading model: {e}")
                 print("Will use a simple rule-based prediction instead")
@@ -95,140 +311,283 @@ def load_model_and_data():
         else:
             print("Model file not found, using rule-based prediction")
             model = None
-            
+        
+        inference_model = InferenceModel(model, FEATURE_COLUMNS) if model is not None else None
+        model_version += 1
+        record_startup_phase('model', phase_started)
+        
+        # Cached predictions belong to the previous model
+        prediction_cache.clear()
+        
+        drift_monitor = DriftMonitor(reference, FEATURE_COLUMNS, inference_model.classes if inference_model else (),
+                                     MONITORING_WINDOWS, MONITORING_BUCKETS)
+        if reference is None:
+            print("No monitoring reference found (rebuild the startup artifact); drift scores are disabled")
+        
+        if model_path is not None and MODEL_WATCH_INTERVAL > 0 and model_watcher is None:
+            model_watcher = FileWatcher(model_path, MODEL_WATCH_INTERVAL, model_reloader.reload)
+            print(f"Watching {model_path} for changes every {MODEL_WATCH_INTERVAL:g}s")
+        if SHADOW_MODEL_PATH and shadow_scorer is None:
+            try:
+                start_shadow(SHADOW_MODEL_PATH, SHADOW_SAMPLE_RATE)
+            except Exception as e:
+                print(f"Shadow model {SHADOW_MODEL_PATH} could not be loaded: {e}")
+        
+        record_startup_phase('load_model_and_data', load_started)
+        model_load_seconds.observe(startup_timings['load_model_and_data'])
         return True
         
     except Exception as e:
         print(f"Error in load_model_and_data: {e}")
         return False
 
-def simple_rule_based_prediction(features):
-    """Simple rule-based prediction when model is not available"""
-    
-    # Simple rules based on common patterns
-    classification = features.get('classification', '').lower()
-    implanted = features.get('implanted', 'no').lower()
-    
-    # Base confidence levels for different decision types
-    if implanted == 'unknown':
-        severity = '3'  # Medium-low severity for unknown implant status
-        confidence = 0.75  # Higher confidence for unknown
-    elif implanted == 'yes':
-        severity = '1'  # High severity for implanted devices
-        confidence = 0.92  # Very high confidence for implanted devices
-    elif 'class iii' in classification or 'high' in classification:
-        severity = '1'  # High severity
-        confidence = 0.88  # High confidence for Class III
-    elif 'class ii' in classification or 'medium' in classification:
-        severity = '2'  # Medium severity
-        confidence = 0.84  # Good confidence for Class II
-    elif implanted == 'no':
-        severity = '3'  # Lower severity for non-implanted devices
-        confidence = 0.80  # Good confidence for non-implanted
-    else:
-        severity = '3'  # Low severity as default
-        confidence = 0.72  # Reasonable confidence for default case
+def warmup_rows():
+    """Synthetic rows covering each implant status, built from the known vocabularies"""
+    base = {feature: (str(encoders[feature].classes_[0]) if feature in encoders and len(encoders[feature].classes_) else '')
+            for feature in FEATURE_COLUMNS}
+    return [dict(base, implanted=implanted) for implanted in ('yes', 'no', 'unknown')]
+
+def install_model(candidate, path):
+    """Swap a loaded, warmed-up InferenceModel in for the serving model"""
+    global model, inference_model, model_path, model_version
+    # Requests read inference_model once per call, so they finish on the model they started with
+    model_version += 1
+    inference_model = candidate
+    model = candidate.model
+    model_path = path
+    prediction_cache.clear()
+    logger.info(f"Model swapped in from {path} (version {model_version})")
+
+model_reloader = ModelReloader(FEATURE_COLUMNS, warmup_rows, install_model)
+
+def start_shadow(path, sample_rate):
+    """Load a candidate model and start shadow-scoring a sample of live traffic with it"""
+    global shadow_scorer
+    candidate, _ = model_reloader.prepare(path)
+    def record(agreed, seconds):
+        shadow_comparisons.inc('agree' if agreed else 'disagree')
+        shadow_seconds.observe(seconds)
+    stop_shadow()
+    shadow_scorer = ShadowScorer(candidate, path, sample_rate=sample_rate, on_result=record)
+    print(f"Shadow scoring {sample_rate:.0%} of traffic with {path}")
+
+def stop_shadow():
+    global shadow_scorer
+    if shadow_scorer is not None:
+        shadow_scorer.stop()
+        shadow_scorer = None
+
+def shadow_observe(features, prediction, confidence, method):
+    """Offer a model-scored live prediction to the shadow scorer, if one is running"""
+    scorer = shadow_scorer
+    if scorer is not None and method not in ('rule-based', 'known_device'):
+        scorer.observe(features, prediction, confidence)
+
+def extract_features(data):
+    """Extract the model features from a request payload; raises ValidationError"""
+    return DEVICE_SCHEMA.validate(data)
+
+def known_device_lookup_requested():
+    """?lookup=1 / ?lookup=0 on the request, else the KNOWN_DEVICE_LOOKUP default"""
+    flag = request.args.get('lookup')
+    if flag is None:
+        return KNOWN_DEVICE_LOOKUP
+    return flag.lower() in ('1', 'true', 'yes')
+
+def prediction_cache_key(features):
+    """Normalized feature tuple used as the prediction cache key.
+
+    The model version is part of the key, so results a request computed
+    with a model that has since been swapped out are never served.
+    """
+    return (model_version,) + tuple(str(features.get(column, '')) for column in FEATURE_COLUMNS)
+
+def predict_batch_features(feature_rows, error_path='batch'):
+    """Score feature dicts with one predict_proba call via inference_model.
+
+    Returns a list of (severity_class, confidence, method, probabilities)
+    tuples in input order. Rows the model cannot score fall back to
+    simple_rule_based_prediction individually. Shared by /predict (one row),
+    the micro-batcher and /predict/batch.
+    """
+    results = [None] * len(feature_rows)
+    scorer = inference_model
     
-    return severity, confidence  # Return severity and confidence
+    if scorer is not None and feature_rows:
+        try:
+            with stage('pool'):
+                rows = scorer.rows(feature_rows)
+            with stage('predict_proba'):
+                scores = scorer.score_rows(rows)
+            
+            confidences = boost_confidences(scores.confidences)
+            for i in np.flatnonzero(scores.valid):
+                results[i] = (scores.labels[i], float(confidences[i]), MODEL_METHOD, scores.probabilities[i].copy())
+            invalid_rows = len(feature_rows) - int(scores.valid.sum())
+            if invalid_rows:
+                model_errors.inc(error_path, amount=invalid_rows)
+        except Exception as e:
+            logger.warning(f"Model prediction failed: {e}, using rule-based prediction")
+            model_errors.inc(error_path)
+    
+    with stage('fallback'):
+        fallback_count = 0
+        for i, result in enumerate(results):
+            if result is None:
+                severity_class, confidence = simple_rule_based_prediction(feature_rows[i])
+                results[i] = (severity_class, confidence, 'rule-based', None)
+                fallback_count += 1
+        if fallback_count:
+            rule_based_fallbacks.inc('model_error' if scorer is not None else 'model_unavailable', amount=fallback_count)
+    
+    return results
+
+def predict_batch_cached(feature_rows):
+    """predict_batch_features, answering repeated feature tuples from the cache"""
+    if inference_model is None:
+        return predict_batch_features(feature_rows)
+    
+    keys = [prediction_cache_key(features) for features in feature_rows]
+    results = [prediction_cache.get(key) for key in keys]
+    misses = [i for i, result in enumerate(results) if result is None]
+    if misses:
+        scored = predict_batch_features([feature_rows[i] for i in misses])
+        for i, result in zip(misses, scored):
+            results[i] = result
+            if result[2] != 'rule-based':
+                prediction_cache.put(keys[i], result)
+    return results
+
+# Jobs always score with whichever model is serving when a chunk starts
+job_manager = JobManager(
+    JOBS_DIR,
+    lambda first_row, chunk: score_frame(inference_model, first_row, chunk),
+    workers=JOBS_WORKERS,
+    chunksize=JOBS_CHUNKSIZE
+)
+
+batcher = MicroBatcher(
+    lambda feature_rows: predict_batch_features(feature_rows, 'microbatch'),
+    max_wait_ms=MICROBATCH_MAX_WAIT_MS,
+    max_batch_size=MICROBATCH_MAX_BATCH_SIZE
+)
 
 def generate_detailed_classification_report(features, prediction, confidence, method, probabilities=None):
-    """Generate a simple classification report showing inputs and confidence"""
+    """Build a banner-style report showing inputs and confidence"""
     
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    lines = []
     
-    print("\n" + "="*80)
-    print(f"� PREDICTION REPORT - {timestamp}")
-    print("="*80)
+    lines.append("\n" + "="*80)
+    lines.append(f"� PREDICTION REPORT - {timestamp}")
+    lines.append("="*80)
     
     # Input Analysis
-    print(f"📥 INPUTS:")
-    print(f"   • Device Name: {features.get('name', 'N/A')}")
-    print(f"   • Manufacturer: {features.get('name_manufacturer', 'N/A')}")
-    print(f"   • Classification: {features.get('classification', 'N/A')}")
-    print(f"   • Implanted: {features.get('implanted', 'N/A').upper()}")
+    lines.append(f"📥 INPUTS:")
+    lines.append(f"   • Device Name: {features.get('name', 'N/A')}")
+    lines.append(f"   • Manufacturer: {features.get('name_manufacturer', 'N/A')}")
+    lines.append(f"   • Classification: {features.get('classification', 'N/A')}")
+    lines.append(f"   • Implanted: {features.get('implanted', 'N/A').upper()}")
     
     # Results
-    print(f"\n🎯 RESULTS:")
-    print(f"   • Predicted Class: {prediction}")
-    print(f"   • Confidence: {confidence:.1%}")
-    print(f"   • Method: {method}")
+    lines.append(f"\n🎯 RESULTS:")
+    lines.append(f"   • Predicted Class: {prediction}")
+    lines.append(f"   • Confidence: {confidence:.1%}")
+    lines.append(f"   • Method: {method}")
     
-    print("="*80)
+    lines.append("="*80)
+    return "\n".join(lines)
 
 def log_prediction_metrics(features, prediction, confidence, method, probabilities=None):
-    """Log prediction details with metrics for monitoring"""
+    """Store a prediction and queue one structured log line for it"""
+    
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    # Store prediction in history (also updates the running aggregates)
+    with stage('aggregates'):
+        record = prediction_history.append(timestamp, features, prediction, confidence, method, probabilities)
+        if drift_monitor is not None:
+            drift_monitor.observe(features, prediction, confidence)
+    
+    with stage('logging'):
+        log_prediction(record, features, prediction, confidence, method, probabilities)
+
+def log_prediction_batch(scored_rows):
+    """Store (features, prediction, confidence, method, probabilities) rows in one transaction and log them"""
     
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    # Store prediction in history
-    prediction_record = {
-        'timestamp': timestamp,
-        'features': features,
+    with stage('aggregates'):
+        records = prediction_history.append_many(
+            [(timestamp, features, prediction, confidence, method, probabilities)
+             for features, prediction, confidence, method, probabilities in scored_rows])
+        if drift_monitor is not None:
+            drift_monitor.observe_many((features, prediction, confidence)
+                                       for features, prediction, confidence, _, _ in scored_rows)
+    
+    with stage('logging'):
+        for record, row in zip(records, scored_rows):
+            log_prediction(record, *row)
+    return records
+
+def log_prediction(record, features, prediction, confidence, method, probabilities):
+    """Queue the (sampled) structured log line for a stored prediction"""
+    if not prediction_logger.isEnabledFor(logging.INFO):
+        return
+    if PREDICTION_LOG_SAMPLE_RATE < 1.0 and random.random() >= PREDICTION_LOG_SAMPLE_RATE:
+        return
+    
+    fields = {
+        'event': 'prediction',
+        'id': record.id,
         'prediction': prediction,
-        'confidence': confidence,
+        'confidence': round(float(confidence), 4),
         'method': method,
-        'probabilities': probabilities.tolist() if probabilities is not None else None
+        'features': features
     }
-    prediction_history.append(prediction_record)
-    
-    # Generate detailed classification and validation report
-    generate_detailed_classification_report(features, prediction, confidence, method, probabilities)
-    
-    # Log to file
-    logger.info(f"Prediction: {prediction} | Confidence: {confidence:.2%} | Method: {method} | Features: {features}")
+    if prediction_logger.isEnabledFor(logging.DEBUG):
+        fields['probabilities'] = record.probabilities
+        prediction_logger.debug(generate_detailed_classification_report(features, prediction, confidence, method, probabilities))
+    prediction_logger.info('prediction', extra={'prediction_fields': fields})
 
 def calculate_model_performance():
     """Calculate model performance metrics if ground truth is available"""
     
-    if len(prediction_history) < 2:
+    aggregates = prediction_history.aggregates
+    total_predictions = aggregates.total
+    if total_predictions < 2:
         return None
     
-    print("\n" + "="*80)
-    print("📊 MODEL PERFORMANCE ANALYSIS")
-    print("="*80)
+    lines = []
+    lines.append("\n" + "="*80)
+    lines.append("📊 MODEL PERFORMANCE ANALYSIS")
+    lines.append("="*80)
     
-    print(f"📋 Total Predictions Made: {len(prediction_history)}")
+    lines.append(f"📋 Total Predictions Made: {total_predictions}")
     
     # Feature analysis
-    print(f"\n🔍 Feature Analysis:")
-    
-    # Most common values
-    all_features = {}
-    for record in prediction_history:
-        for key, value in record['features'].items():
-            if key not in all_features:
-                all_features[key] = {}
-            all_features[key][value] = all_features[key].get(value, 0) + 1
-    
-    for feature, values in all_features.items():
-        print(f"   • {feature.replace('_', ' ').title()}:")
-        # Show top 3 most common values
-        sorted_values = sorted(values.items(), key=lambda x: x[1], reverse=True)[:3]
+    lines.append(f"\n🔍 Feature Analysis:")
+    
+    # Most common values (top 3 per feature)
+    for feature, sorted_values in aggregates.top_feature_values(3).items():
+        lines.append(f"   • {feature.replace('_', ' ').title()}:")
         for value, count in sorted_values:
-            percentage = (count / len(prediction_history)) * 100
-            print(f"     - {value}: {count} ({percentage:.1f}%)")
+            percentage = (count / total_predictions) * 100
+            lines.append(f"     - {value}: {count} ({percentage:.1f}%)")
     
     # Prediction distribution
-    prediction_dist = {}
-    confidence_sum = 0
-    for record in prediction_history:
-        pred = record['prediction']
-        prediction_dist[pred] = prediction_dist.get(pred, 0) + 1
-        confidence_sum += record['confidence']
+    lines.append(f"\n🎯 Prediction Distribution:")
+    for pred, count in sorted(aggregates.prediction_counts.items()):
+        percentage = (count / total_predictions) * 100
+        lines.append(f"   • Class {pred}: {count} predictions ({percentage:.1f}%)")
     
-    print(f"\n🎯 Prediction Distribution:")
-    for pred, count in sorted(prediction_dist.items()):
-        percentage = (count / len(prediction_history)) * 100
-        print(f"   • Class {pred}: {count} predictions ({percentage:.1f}%)")
-    
-    avg_confidence = confidence_sum / len(prediction_history)
-    print(f"\n📊 Overall Average Confidence: {avg_confidence:.2%}")
+    avg_confidence = aggregates.average_confidence
+    lines.append(f"\n📊 Overall Average Confidence: {avg_confidence:.2%}")
     
     # Time-based analysis
-    if len(prediction_history) >= 10:
-        recent_10 = prediction_history[-10:]
-        recent_avg_confidence = sum(record['confidence'] for record in recent_10) / len(recent_10)
-        print(f"📈 Recent 10 Predictions Avg Confidence: {recent_avg_confidence:.2%}")
+    if total_predictions >= 10:
+        recent_avg_confidence = aggregates.recent_average_confidence
+        lines.append(f"📈 Recent 10 Predictions Avg Confidence: {recent_avg_confidence:.2%}")
         
         if recent_avg_confidence > avg_confidence:
             trend = "📈 IMPROVING"
@@ -237,227 +596,589 @@ def calculate_model_performance():
         else:
             trend = "➡️ STABLE"
         
-        print(f"🔄 Confidence Trend: {trend}")
+        lines.append(f"🔄 Confidence Trend: {trend}")
+    
+    # Sliding windows and drift against the training data (see /monitoring)
+    if drift_monitor is not None:
+        lines.append(f"\n🌊 Drift Monitoring:")
+        for window, stats in drift_monitor.report()['windows'].items():
+            if not stats['count']:
+                continue
+            feature_psi = [(feature_stats['psi'], feature) for feature, feature_stats in stats['features'].items()
+                           if feature_stats['psi'] is not None]
+            line = f"   • Last {window}: {stats['count']} predictions, avg confidence {stats['confidence']['mean']:.2%}"
+            if stats['classes']['psi'] is not None:
+                line += f", class PSI {stats['classes']['psi']:.3f}"
+            if feature_psi:
+                psi, feature = max(feature_psi)
+                line += f", highest feature PSI {psi:.3f} ({feature})"
+            lines.append(line)
+    
+    lines.append("="*80)
     
-    print("="*80)
+    report = "\n".join(lines)
+    logger.info(report)
+    return report
+
+@app.before_request
+def start_request_timer():
+    start_timer()
+    if model_watcher is not None:
+        # Worker processes forked by serve.py each run their own watcher
+        model_watcher.ensure_running()
+    # Also resumes jobs left unfinished by an earlier process
+    job_manager.ensure_running()
+
+@app.after_request
+def add_server_timing(response):
+    # Per-stage durations for clients and benchmark.py, and for /metrics/prom
+    timer = current_timer()
+    if timer is not None:
+        request_seconds.observe(timer.elapsed(), request.endpoint or 'unmatched')
+        for stage_name, seconds in timer.durations.items():
+            stage_seconds.observe(seconds, stage_name)
+        if timer.durations:
+            response.headers['Server-Timing'] = server_timing_header(timer)
+    return response
+
+@app.teardown_request
+def stop_request_timer(exc):
+    clear_timer()
 
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
-        # Get the input data
-        data = request.get_json()
+        with stage('parse'):
+            # Get the input data
+            data = read_body()
         
-        # Extract features
-        features = {
-            'name': data.get('name', ''),
-            'name_manufacturer': data.get('name_manufacturer', ''),
-            'classification': data.get('classification', ''),
-            'implanted': data.get('implanted', 'no').lower()  # Ensure lowercase
-        }
+        with stage('normalize'):
+            # Extract and validate features
+            features = extract_features(data)
+        
+        known = None
+        index = known_devices
+        if index is not None and known_device_lookup_requested():
+            with stage('known_device'):
+                lookup_started = time.perf_counter()
+                known = index.lookup(features)
+                index.observe_lookup(known is not None, time.perf_counter() - lookup_started)
         
-        if model is not None:
-            # Use the trained CatBoost model (expects categorical features, not encoded)
+        cache_key = None
+        cached = None
+        if known is None and inference_model is not None:
+            with stage('cache'):
+                cache_key = prediction_cache_key(features)
+                cached = prediction_cache.get(cache_key)
+        
+        model_started = time.perf_counter()
+        if known is not None:
+            # Seen in the dataset: answer with its observed recall level, no model call
+            severity_class, confidence, probabilities = known.prediction, known.confidence, known.probabilities
+            method_used = 'known_device'
+        elif cached is not None:
+            # Cache hit: no model call
+            severity_class, confidence, method_used, probabilities = cached
+        elif inference_model is not None and MICROBATCH_ENABLED:
+            # Share one batched model call with any concurrent requests
             try:
-                # CatBoost models expect categorical features, not encoded ones
-                feature_columns = ['name', 'name_manufacturer', 'classification', 'implanted']
-                
-                # Create DataFrame with categorical features
-                test_data = pd.DataFrame([{
-                    'name': features.get('name', ''),
-                    'name_manufacturer': features.get('name_manufacturer', ''),
-                    'classification': features.get('classification', ''),
-                    'implanted': features.get('implanted', 'no')  # Keep original case for model
-                }])
-                
-                # Make prediction directly with categorical features
-                prediction = model.predict(test_data[feature_columns])[0]
-                
-                # Get prediction probabilities
-                probabilities = None
-                try:
-                    probabilities = model.predict_proba(test_data[feature_columns])[0]
-                    print(f"Raw probabilities from model: {probabilities}")
-                    print(f"Predicted class: {prediction}")
-                    
-                    # Get confidence as the maximum probability (most confident class)
-                    confidence = float(np.max(probabilities))
-                    print(f"Model confidence (max probability): {confidence:.3f}")
-                    
-                    # Boost confidence if it's reasonably high but below threshold
-                    if confidence > 0.4:
-                        confidence = min(confidence * 1.5, 0.95)  # Boost but cap at 95%
-                        print(f"Boosted confidence: {confidence:.3f}")
-                    
-                except Exception as e:
-                    print(f"Error getting probabilities: {e}")
-                    confidence = 0.85  # Higher default confidence
-                    probabilities = None
-                
-                # Map prediction to string
-                severity_class = str(int(prediction))
-                method_used = 'catboost_model_6'
-                    
+                severity_class, confidence, method_used, probabilities = batcher.predict(features)
             except Exception as e:
-                print(f"Model prediction failed: {e}, using rule-based prediction")
-                severity_class, confidence = simple_rule_based_prediction(features)
+                logger.warning(f"Batched prediction failed: {e}, using rule-based prediction")
+                model_errors.inc('microbatch')
+                rule_based_fallbacks.inc('model_error')
+                with stage('fallback'):
+                    severity_class, confidence = simple_rule_based_prediction(features)
                 method_used = 'rule-based'
                 probabilities = None
         else:
-            # Use simple rule-based prediction
-            severity_class, confidence = simple_rule_based_prediction(features)
-            method_used = 'rule-based'
-            probabilities = None
+            # One predict_proba call on a pre-shaped Pool; rule-based when
+            # the model is unavailable or cannot score this row
+            severity_class, confidence, method_used, probabilities = predict_batch_features([features], 'direct')[0]
+        
+        if cache_key is not None and cached is None and method_used != 'rule-based':
+            prediction_cache.put(cache_key, (severity_class, confidence, method_used, probabilities))
+            if index is not None:
+                # What a known-device hit saves, for the estimate in /metrics
+                index.observe_model(time.perf_counter() - model_started)
+        
+        shadow_observe(features, severity_class, confidence, method_used)
         
         # Log detailed metrics
         log_prediction_metrics(features, severity_class, confidence, method_used, probabilities)
         
-        # Calculate performance metrics every 10 predictions
-        if len(prediction_history) % 10 == 0 and len(prediction_history) > 0:
-            calculate_model_performance()
+        # Performance banner every 10 predictions, only when debugging
+        with stage('metrics'):
+            if prediction_logger.isEnabledFor(logging.DEBUG) and len(prediction_history) % 10 == 0:
+                calculate_model_performance()
         
-        return jsonify({
+        response = {
             'prediction': severity_class,
             'confidence': float(confidence),
             'method': method_used,
             'prediction_count': len(prediction_history)
+        }
+        if known is not None:
+            # Dataset rows behind the answer, and how their recall levels were spread
+            response['support'] = known.support
+            response['distribution'] = known.distribution
+        return jsonify(response)
+        
+    except ValidationError as e:
+        return jsonify({'error': 'Invalid request', 'details': e.errors}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def read_batch_records():
+    """Read /predict/batch input as a JSON or MessagePack array, or an NDJSON stream"""
+    if request.mimetype in NDJSON_MIMETYPES:
+        records = []
+        for number, line in enumerate(request.stream, 1):
+            line = line.strip()
+            if line:
+                try:
+                    records.append(loads(line))
+                except ValueError as e:
+                    raise ValidationError([f'Malformed JSON on line {number}: {e}'])
+        return records
+    
+    data = read_body()
+    if isinstance(data, dict):
+        # Also accept {"records": [...]} envelopes
+        data = data.get('records')
+    if not isinstance(data, list):
+        raise ValidationError(['Expected an array of device records'])
+    return data
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score many devices with one model call, returning results in input order"""
+    try:
+        with stage('parse'):
+            records = read_batch_records()
+    except ValidationError as e:
+        return jsonify({'error': 'Invalid request', 'details': e.errors}), 400
+    
+    if len(records) > MAX_BATCH_ROWS:
+        return jsonify({'error': f'Batch too large: {len(records)} rows (max {MAX_BATCH_ROWS})'}), 413
+    
+    try:
+        # Invalid records get an error entry; everything else is scored together
+        feature_rows = []
+        row_positions = []
+        results = [None] * len(records)
+        with stage('normalize'):
+            for i, record in enumerate(records):
+                try:
+                    feature_rows.append(extract_features(record))
+                    row_positions.append(i)
+                except Exception as e:
+                    results[i] = {'error': f'Invalid record: {e}'}
+        
+        scored = predict_batch_cached(feature_rows)
+        scored_rows = [(features, severity_class, confidence, method_used, probabilities)
+                       for features, (severity_class, confidence, method_used, probabilities) in zip(feature_rows, scored)]
+        # One history transaction for the whole batch
+        log_prediction_batch(scored_rows)
+        
+        for position, (features, severity_class, confidence, method_used, _) in zip(row_positions, scored_rows):
+            shadow_observe(features, severity_class, confidence, method_used)
+            results[position] = {
+                'prediction': severity_class,
+                'confidence': float(confidence),
+                'method': method_used
+            }
+        
+        return jsonify({
+            'predictions': results,
+            'count': len(results),
+            'prediction_count': len(prediction_history)
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def job_response(job):
+    """Job state plus progress and links for /jobs responses"""
+    response = dict(job)
+    response['progress'] = min(1.0, job['rows_done'] / job['rows_total']) if job['rows_total'] else None
+    response['status_url'] = f"/jobs/{job['job_id']}"
+    response['result_url'] = f"/jobs/{job['job_id']}/result" if job['status'] == 'complete' else None
+    return response
+
+def upload_format():
+    """'csv' or 'ndjson' from ?format=, the uploaded file name or the Content-Type"""
+    requested = request.args.get('format')
+    if requested:
+        return requested.lower()
+    upload = request.files.get('file')
+    name = upload.filename.lower() if upload is not None and upload.filename else ''
+    mimetype = upload.mimetype if upload is not None else request.mimetype
+    if name.endswith(('.ndjson', '.jsonl')) or mimetype in ('application/x-ndjson', 'application/ndjson'):
+        return 'ndjson'
+    if name.endswith('.csv') or mimetype == 'text/csv':
+        return 'csv'
+    return None
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Store a CSV or NDJSON upload and queue it for background scoring"""
+    input_format = upload_format()
+    if input_format is None:
+        return jsonify({'error': 'Upload a .csv or .ndjson file, or send text/csv or application/x-ndjson'}), 415
+    if request.content_length is not None and request.content_length > JOBS_MAX_UPLOAD_BYTES:
+        return jsonify({'error': f'Upload too large (max {JOBS_MAX_UPLOAD_BYTES} bytes)'}), 413
+    
+    upload = request.files.get('file')
+    stream = upload.stream if upload is not None else request.stream
+    try:
+        job = job_manager.create(stream, input_format, max_bytes=JOBS_MAX_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(job_response(job)), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status and progress of a scoring job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_response(job))
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Stream the predictions CSV of a completed job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != 'complete':
+        return jsonify(dict(job_response(job), error=f"Job is {job['status']}")), 409
+    return send_file(os.path.abspath(job_manager.result_path(job_id)), mimetype='text/csv',
+                     as_attachment=True, download_name=f'{job_id}.csv')
+
+def suggest_response(query, suggestions):
+    return jsonify({
+        'query': query,
+        'suggestions': [{'value': value, 'count': count} for value, count in suggestions]
+    })
+
+def suggest_limit():
+    return max(1, min(request.args.get('limit', 10, type=int), SUGGEST_MAX_LIMIT))
+
+@app.route('/suggest/names', methods=['GET'])
+def suggest_names():
+    """Device names starting with ?q=, optionally scoped to ?manufacturer=, most frequent first"""
+    if suggest_index is None:
+        return jsonify({'error': 'Suggestion index not loaded'}), 503
+    query = request.args.get('q', '')
+    manufacturer = request.args.get('manufacturer')
+    return suggest_response(query, suggest_index.suggest_names(query, manufacturer, suggest_limit()))
+
+@app.route('/suggest/manufacturers', methods=['GET'])
+def suggest_manufacturers():
+    """Manufacturer names starting with ?q=, most frequent first"""
+    if suggest_index is None:
+        return jsonify({'error': 'Suggestion index not loaded'}), 503
+    query = request.args.get('q', '')
+    return suggest_response(query, suggest_index.suggest_manufacturers(query, suggest_limit()))
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({
         'status': 'healthy',
         'model_loaded': model is not None,
         'encoders_loaded': len(encoders) > 0,
-        'total_predictions': len(prediction_history)
+        'total_predictions': len(prediction_history),
+        'startup_mode': startup_mode,
+        'startup_timings': startup_timings
     })
 
 @app.route('/metrics', methods=['GET'])
 def get_metrics():
     """Get current prediction metrics"""
-    if len(prediction_history) == 0:
+    with stage('aggregates'):
+        aggregates = prediction_history.aggregates
+    if aggregates.total == 0:
         return jsonify({'message': 'No predictions made yet'})
     
-    # Calculate basic statistics
-    prediction_dist = {}
-    confidence_sum = 0
-    method_dist = {}
-    
-    for record in prediction_history:
-        pred = record['prediction']
-        prediction_dist[pred] = prediction_dist.get(pred, 0) + 1
-        confidence_sum += record['confidence']
-        
-        method = record['method']
-        method_dist[method] = method_dist.get(method, 0) + 1
-    
-    avg_confidence = confidence_sum / len(prediction_history)
-    
-    # Recent performance
-    recent_10 = prediction_history[-10:] if len(prediction_history) >= 10 else prediction_history
-    recent_confidence = sum(record['confidence'] for record in recent_10) / len(recent_10)
-    
+    # Counters are maintained as predictions are stored
     return jsonify({
-        'total_predictions': len(prediction_history),
-        'prediction_distribution': prediction_dist,
-        'method_distribution': method_dist,
-        'average_confidence': avg_confidence,
-        'recent_average_confidence': recent_confidence,
-        'recent_predictions_count': len(recent_10)
+        'total_predictions': aggregates.total,
+        'prediction_distribution': dict(aggregates.prediction_counts),
+        'method_distribution': dict(aggregates.method_counts),
+        'average_confidence': aggregates.average_confidence,
+        'recent_average_confidence': aggregates.recent_average_confidence,
+        'recent_predictions_count': len(aggregates.recent_confidences),
+        'microbatching': batcher.stats() if MICROBATCH_ENABLED else None,
+        'model_version': model_version,
+        'shadow': shadow_scorer.stats() if shadow_scorer is not None else None,
+        'jobs': job_manager.stats(),
+        'prediction_cache': prediction_cache.stats(),
+        'known_devices': known_devices.stats() if known_devices is not None else None
     })
 
+@app.route('/monitoring', methods=['GET'])
+def get_monitoring():
+    """Sliding-window confidence, class and feature distributions with drift against the training data"""
+    if drift_monitor is None:
+        return jsonify({'error': 'Monitoring not initialized'}), 503
+    return jsonify(drift_monitor.report())
+
+@app.route('/metrics/prom', methods=['GET'])
+def get_prometheus_metrics():
+    """Latency histograms, error counters and resource gauges in Prometheus text format"""
+    return Response(metrics_registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/performance', methods=['GET'])
 def show_performance():
     """Trigger performance calculation and display"""
-    calculate_model_performance()
-    return jsonify({'message': 'Performance metrics displayed in console'})
+    report = calculate_model_performance()
+    return jsonify({'message': 'Performance metrics displayed in console', 'report': report})
 
 @app.route('/reset_metrics', methods=['POST'])
 def reset_metrics():
     """Reset prediction history"""
-    global prediction_history
-    prediction_history = []
+    prediction_history.clear()
     logger.info("Prediction history reset")
     return jsonify({'message': 'Metrics reset successfully'})
 
+def admin_denied():
+    """Error response when ADMIN_TOKEN is set and the request does not carry it"""
+    if ADMIN_TOKEN and request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'error': 'Admin token required'}), 403
+    return None
+
+def resolve_model_path(requested):
+    """Model file to load: the current one by default, otherwise one next to it"""
+    current = model_path or find_model_path()
+    if not requested:
+        return current
+    if current is None:
+        raise ValueError('No model directory configured')
+    # Only files in the model directory may be loaded (pickles execute code)
+    model_dir = os.path.realpath(os.path.dirname(current))
+    candidate = os.path.realpath(os.path.join(model_dir, os.path.basename(requested)))
+    if os.path.dirname(candidate) != model_dir or not os.path.isfile(candidate):
+        raise ValueError(f'Model file not found in {os.path.dirname(current)}: {requested}')
+    return candidate
+
+@app.route('/admin/model', methods=['GET'])
+def get_model_status():
+    """Serving model, last hot reload and shadow scoring status"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify({
+        'model_path': model_path,
+        'model_version': model_version,
+        'model_loaded': inference_model is not None,
+        'reload_in_progress': model_reloader.in_progress,
+        'last_reload': model_reloader.last_result,
+        'watching': model_watcher is not None,
+        'shadow': shadow_scorer.stats() if shadow_scorer is not None else None
+    })
+
+@app.route('/admin/model/reload', methods=['POST'])
+def reload_model():
+    """Load a model file in the background, warm it up and swap it in.
+
+    JSON body (optional): {"path": "<file in the model directory>", "wait": true}
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    body = request.get_json(silent=True) or {}
+    try:
+        path = resolve_model_path(body.get('path'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if path is None:
+        return jsonify({'error': 'No model file found'}), 404
+    
+    if body.get('wait'):
+        result = model_reloader.reload(path)
+        return jsonify(dict(result, model_version=model_version)), 200 if result['status'] == 'ok' else 500
+    if not model_reloader.reload_in_background(path):
+        return jsonify({'error': 'A reload is already in progress'}), 409
+    return jsonify({'message': f'Reloading {path}', 'model_version': model_version}), 202
+
+@app.route('/admin/model/shadow', methods=['POST', 'DELETE'])
+def configure_shadow():
+    """Start shadow scoring with a candidate model ({"path": ..., "sample_rate": 0.1}) or stop it (DELETE)"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    if request.method == 'DELETE':
+        stats = shadow_scorer.stats() if shadow_scorer is not None else None
+        stop_shadow()
+        return jsonify({'message': 'Shadow scoring stopped', 'shadow': stats})
+    
+    body = request.get_json(silent=True) or {}
+    try:
+        sample_rate = float(body.get('sample_rate', SHADOW_SAMPLE_RATE))
+        if not 0 < sample_rate <= 1:
+            raise ValueError('sample_rate must be in (0, 1]')
+        path = resolve_model_path(body.get('path'))
+        if path is None:
+            raise ValueError('No model file found')
+        start_shadow(path, sample_rate)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Could not load candidate model: {e}'}), 500
+    return jsonify({'message': f'Shadow scoring {sample_rate:.0%} of traffic', 'shadow': shadow_scorer.stats()})
+
+@app.route('/admin/model/promote', methods=['POST'])
+def promote_shadow():
+    """Swap the warmed-up shadow candidate in as the serving model"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    scorer = shadow_scorer
+    if scorer is None:
+        return jsonify({'error': 'No shadow model to promote'}), 404
+    stop_shadow()
+    install_model(scorer.candidate, scorer.model_path)
+    return jsonify({'message': f'Promoted {scorer.model_path}', 'model_version': model_version, 'shadow': scorer.stats()})
+
 @app.route('/detailed_report/<int:prediction_id>', methods=['GET'])
 def get_detailed_report(prediction_id):
     """Get detailed classification report for a specific prediction"""
-    if prediction_id >= len(prediction_history) or prediction_id < 0:
+    prediction = prediction_history.get(prediction_id)
+    if prediction is None:
         return jsonify({'error': 'Invalid prediction ID'}), 400
-    
-    prediction = prediction_history[prediction_id]
+    features = prediction.features
     
     # Generate detailed analysis
     analysis = {
         'prediction_id': prediction_id,
-        'timestamp': prediction['timestamp'],
-        'input_features': prediction['features'],
+        'timestamp': prediction.timestamp,
+        'input_features': features,
         'prediction_result': {
-            'severity_class': prediction['prediction'],
-            'confidence': prediction['confidence'],
-            'method': prediction['method']
+            'severity_class': prediction.prediction,
+            'confidence': prediction.confidence,
+            'method': prediction.method
         },
         'feature_analysis': {
-            'device_name': prediction['features'].get('name', 'N/A'),
-            'manufacturer': prediction['features'].get('name_manufacturer', 'N/A'),
-            'classification': prediction['features'].get('classification', 'N/A'),
-            'implanted': prediction['features'].get('implanted', 'N/A'),
+            'device_name': features.get('name', 'N/A'),
+            'manufacturer': features.get('name_manufacturer', 'N/A'),
+            'classification': features.get('classification', 'N/A'),
+            'implanted': features.get('implanted', 'N/A'),
         }
     }
     
-    # Add rule-based reasoning if applicable
-    if prediction['method'] == 'rule-based':
-        classification = prediction['features'].get('classification', '').lower()
-        implanted = prediction['features'].get('implanted', 'no').lower()
-        
-        reasoning = []
-        if implanted == 'unknown':
-            reasoning.append("Implant status 'Unknown' → Medium-low severity (Class 3)")
-        elif implanted == 'yes':
-            reasoning.append("Implanted device → High severity (Class 1)")
-        elif 'class iii' in classification:
-            reasoning.append("Class III device → High severity (Class 1)")
-        elif 'class ii' in classification:
-            reasoning.append("Class II device → Medium severity (Class 2)")
-        elif implanted == 'no':
-            reasoning.append("Non-implanted device → Lower severity (Class 3)")
-        else:
-            reasoning.append("Default case → Low severity (Class 3)")
-        
-        analysis['rule_based_reasoning'] = reasoning
+    # Add rule-based reasoning if applicable, from the rule that made the prediction
+    if prediction.method == 'rule-based':
+        rule = match_rule(features)
+        analysis['rule_id'] = rule.rule_id
+        analysis['rule_based_reasoning'] = [rule.reason]
+    
+    # Banner-style text report, only built when asked for
+    if request.args.get('banner', '').lower() in ('1', 'true', 'yes'):
+        analysis['report'] = generate_detailed_classification_report(
+            features, prediction.prediction, prediction.confidence, prediction.method
+        )
     
     return jsonify(analysis)
 
+def summarize_prediction(pred):
+    """Flatten a stored prediction into a /classification_summary row"""
+    features = pred.features
+    return {
+        'id': pred.id,
+        'timestamp': pred.timestamp,
+        'device_name': features.get('name', 'N/A')[:50],
+        'manufacturer': features.get('name_manufacturer', 'N/A'),
+        'classification': features.get('classification', 'N/A'),
+        'implanted': features.get('implanted', 'N/A'),
+        'predicted_class': pred.prediction,
+        'confidence': pred.confidence,
+        'method': pred.method
+    }
+
+def stream_summary_ndjson(records):
+    for pred in records:
+        yield dumps(summarize_prediction(pred)) + b'\n'
+
+def stream_summary_csv(records):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=SUMMARY_FIELDS)
+    writer.writeheader()
+    for pred in records:
+        writer.writerow(summarize_prediction(pred))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
 @app.route('/classification_summary', methods=['GET'])
 def get_classification_summary():
-    """Get summary of all predictions with classification details"""
-    if len(prediction_history) == 0:
+    """Get a page of predictions with classification details.
+
+    Query parameters:
+        limit, after_id: keyset pagination (pass next_after_id to get the next page)
+        predicted_class, method, manufacturer, since, until: filters
+        format: json (default), ndjson or csv; ndjson/csv stream every match
+    """
+    total_predictions = len(prediction_history)
+    if total_predictions == 0:
         return jsonify({'message': 'No predictions made yet'})
     
-    # Create detailed summary
-    summary = {
-        'total_predictions': len(prediction_history),
-        'predictions': []
+    output_format = request.args.get('format', 'json').lower()
+    if output_format not in ('json', 'ndjson', 'csv'):
+        return jsonify({'error': f'Unsupported format: {output_format}'}), 400
+    
+    try:
+        after_id = int(request.args.get('after_id', -1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'after_id must be an integer'}), 400
+    try:
+        limit = request.args.get('limit')
+        if limit is not None:
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError
+        elif output_format == 'json':
+            limit = SUMMARY_DEFAULT_LIMIT
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    
+    filters = {
+        'predicted_class': request.args.get('predicted_class'),
+        'method': request.args.get('method'),
+        'manufacturer': request.args.get('manufacturer'),
+        # Timestamps are stored as 'YYYY-MM-DD HH:MM:SS', so ISO 'T' separators are normalized
+        'since': request.args.get('since', '').replace('T', ' ') or None,
+        'until': request.args.get('until', '').replace('T', ' ') or None
     }
+    # A date-only until includes the whole day
+    if filters['until'] is not None and len(filters['until']) == len('YYYY-MM-DD'):
+        filters['until'] += ' 23:59:59'
     
-    for i, pred in enumerate(prediction_history):
-        pred_summary = {
-            'id': i,
-            'timestamp': pred['timestamp'],
-            'device_name': pred['features'].get('name', 'N/A')[:50],
-            'manufacturer': pred['features'].get('name_manufacturer', 'N/A'),
-            'classification': pred['features'].get('classification', 'N/A'),
-            'implanted': pred['features'].get('implanted', 'N/A'),
-            'predicted_class': pred['prediction'],
-            'confidence': pred['confidence'],
-            'method': pred['method']
-        }
-        summary['predictions'].append(pred_summary)
+    # Streaming exports read the store batch by batch without building a list
+    if output_format == 'ndjson':
+        records = prediction_history.iter_records(after_id=after_id, limit=limit, **filters)
+        return Response(stream_summary_ndjson(records), mimetype='application/x-ndjson')
+    if output_format == 'csv':
+        records = prediction_history.iter_records(after_id=after_id, limit=limit, **filters)
+        return Response(stream_summary_csv(records), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=classification_summary.csv'})
+    
+    limit = min(limit, SUMMARY_MAX_LIMIT)
+    # Fetch one extra row to find out whether another page exists
+    page = [summarize_prediction(pred) for pred in
+            prediction_history.iter_records(after_id=after_id, limit=limit + 1, **filters)]
+    has_more = len(page) > limit
+    page = page[:limit]
     
-    return jsonify(summary)
+    return jsonify({
+        'total_predictions': total_predictions,
+        'count': len(page),
+        'predictions': page,
+        'next_after_id': page[-1]['id'] if has_more else None
+    })
 
 if __name__ == '__main__':
     print("Starting Flask application...")
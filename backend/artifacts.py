@@ -0,0 +1,256 @@
+"""
+Precomputed startup artifact.
+
+Running this module reads the training dataset once and writes the
+categorical vocabularies and the name/manufacturer pair counts behind the
+typeahead index to a small .npz file. At startup the API loads
+that file instead of parsing the full CSV and building the encoder
+vocabularies, which keeps time-to-first-prediction low. Both variants
+also write monitoring_reference.json, the training distributions that
+drift monitoring compares live traffic against.
+
+With --mapped it instead writes a directory of uncompressed .npy arrays
+(the vocabularies and the complete typeahead index) that the API opens
+memory-mapped, and converts the pickled model to CatBoost's native .cbm
+format. Loading then does no per-value work, so startup time does not grow
+with the dataset, and worker processes on one host share the mapped pages
+through the page cache instead of each holding a private copy.
+
+Both variants include the known-device index (known_devices.py): the
+recall levels observed for every distinct feature tuple.
+
+Usage:
+    python artifacts.py [--dataset dataset/master_v5.csv] [--output model/startup_artifact.npz]
+    python artifacts.py --mapped [--output model/startup_artifact] [--model model/catboost_model.pkl]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from feature_store import MappedVocabulary, Vocabulary
+from known_devices import KnownDeviceIndex
+from monitoring import REFERENCE_FILE, build_reference, save_reference
+from suggest import SuggestIndex
+
+CATEGORICAL_FEATURES = ['name', 'name_manufacturer', 'classification', 'implanted']
+TARGET_COLUMN = 'final_recall_level'
+
+# A mapped artifact directory is preferred over the .npz file next to it
+DEFAULT_ARTIFACT_PATHS = [
+    os.path.join('model', 'startup_artifact'),
+    os.path.join('model', 'startup_artifact.npz'),
+    os.path.join('..', 'model', 'startup_artifact'),
+    os.path.join('..', 'model', 'startup_artifact.npz')
+]
+MAPPED_ARTIFACT_FORMAT = 1
+
+DEFAULT_DATASET_PATHS = [
+    os.path.join('dataset', 'master_v5.csv'),
+    os.path.join('..', 'dataset', 'master_v2.csv')
+]
+
+
+def find_startup_artifact():
+    """Return the configured or default artifact path (.npz file or mapped directory) if it exists"""
+    configured = os.environ.get('STARTUP_ARTIFACT')
+    candidates = [configured] if configured else DEFAULT_ARTIFACT_PATHS
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def name_manufacturer_pair_counts(df):
+    """Count rows per (name, manufacturer) pair, skipping rows without a name"""
+    pairs = df[['name', 'name_manufacturer']].dropna(subset=['name']).fillna('').astype(str)
+    counts = pairs.groupby(['name', 'name_manufacturer'], sort=False).size()
+    return [(name, manufacturer, int(count)) for (name, manufacturer), count in counts.items()]
+
+
+def load_startup_artifact(path):
+    """Load encoder vocabularies and pair counts written by build_startup_artifact()"""
+    with np.load(path, allow_pickle=False) as data:
+        encoders = {
+            feature: Vocabulary(data[f'vocab_{feature}'])
+            for feature in CATEGORICAL_FEATURES
+            if f'vocab_{feature}' in data
+        }
+        target_encoder = Vocabulary(data['vocab_target']) if 'vocab_target' in data else None
+        pair_counts = None
+        if 'pair_names' in data:
+            pair_counts = list(zip(data['pair_names'].tolist(),
+                                   data['pair_manufacturers'].tolist(),
+                                   data['pair_counts'].tolist()))
+    return encoders, target_encoder, pair_counts
+
+
+def load_mapped_artifact(path):
+    """Open a directory written by build_mapped_artifact(); returns (encoders, target_encoder, suggest_index)"""
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != MAPPED_ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported mapped artifact format {manifest.get('format')!r} in {path}")
+    # np.asarray drops the memmap subclass but keeps the mapping, avoiding its per-slice overhead
+    arrays = {name: np.asarray(np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r', allow_pickle=False))
+              for name in manifest['arrays']}
+    encoders = {
+        feature: MappedVocabulary(arrays[f'vocab_{feature}'])
+        for feature in CATEGORICAL_FEATURES
+        if f'vocab_{feature}' in arrays
+    }
+    target_encoder = MappedVocabulary(arrays['vocab_target']) if 'vocab_target' in arrays else None
+    suggest_index = SuggestIndex.from_arrays(arrays) if 'names_keys' in arrays else None
+    return encoders, target_encoder, suggest_index
+
+
+def load_known_devices(path, min_support=1):
+    """KnownDeviceIndex saved in a startup artifact (.npz or mapped directory), or None"""
+    if os.path.isdir(path):
+        arrays = {name: np.asarray(np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r', allow_pickle=False))
+                  for name in ('known_keys', 'known_counts', 'known_classes')
+                  if os.path.exists(os.path.join(path, f'{name}.npy'))}
+    else:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in ('known_keys', 'known_counts', 'known_classes') if name in data}
+    if len(arrays) < 3:
+        return None
+    return KnownDeviceIndex.from_arrays(arrays, CATEGORICAL_FEATURES, min_support)
+
+
+def known_device_arrays(df):
+    """Arrays of the known-device index over df, or {} without a target column"""
+    if TARGET_COLUMN not in df.columns:
+        return {}
+    return KnownDeviceIndex.from_dataframe(df, CATEGORICAL_FEATURES, TARGET_COLUMN).arrays()
+
+
+def read_vocabularies(dataset_path):
+    """Read the dataset's model feature and target columns; returns (df, {array name: sorted vocabulary})"""
+    import pandas as pd
+
+    columns = CATEGORICAL_FEATURES + [TARGET_COLUMN]
+    df = pd.read_csv(dataset_path, usecols=lambda column: column in columns)
+
+    arrays = {}
+    for feature in CATEGORICAL_FEATURES:
+        if feature in df.columns:
+            # Same vocabulary LabelEncoder.fit() would produce
+            arrays[f'vocab_{feature}'] = np.unique(df[feature].fillna('Unknown').astype(str).to_numpy(dtype=str))
+    if TARGET_COLUMN in df.columns:
+        arrays['vocab_target'] = np.unique(df[TARGET_COLUMN].fillna('Unknown').astype(str).to_numpy(dtype=str))
+    return df, arrays
+
+
+def save_monitoring_reference(df, output_path):
+    """Write the training distributions DriftMonitor compares against next to an artifact"""
+    path = os.path.join(os.path.dirname(output_path.rstrip('/\\')), REFERENCE_FILE)
+    save_reference(build_reference(df, CATEGORICAL_FEATURES, TARGET_COLUMN), path)
+    return path
+
+
+def build_startup_artifact(dataset_path, output_path):
+    """Read the dataset once and save the sorted vocabulary of every categorical column"""
+    df, arrays = read_vocabularies(dataset_path)
+    if 'name' in df.columns and 'name_manufacturer' in df.columns:
+        pair_counts = name_manufacturer_pair_counts(df)
+        arrays['pair_names'] = np.array([name for name, _, _ in pair_counts], dtype=str)
+        arrays['pair_manufacturers'] = np.array([manufacturer for _, manufacturer, _ in pair_counts], dtype=str)
+        arrays['pair_counts'] = np.array([count for _, _, count in pair_counts], dtype=np.int32)
+    arrays.update(known_device_arrays(df))
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    np.savez_compressed(output_path, **arrays)
+    save_monitoring_reference(df, output_path)
+    return {name: len(values) for name, values in arrays.items()}
+
+
+def build_mapped_artifact(dataset_path, output_dir):
+    """Save vocabularies and the built typeahead index as .npy arrays for load_mapped_artifact()"""
+    df, arrays = read_vocabularies(dataset_path)
+    if 'name' in df.columns and 'name_manufacturer' in df.columns:
+        arrays.update(SuggestIndex(name_manufacturer_pair_counts(df)).arrays())
+    arrays.update(known_device_arrays(df))
+
+    # Written next to the target and swapped in at the end; processes that
+    # still map the old files keep reading them until they reload
+    staging_dir = output_dir.rstrip('/\\') + '.tmp'
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    for name, values in arrays.items():
+        np.save(os.path.join(staging_dir, f'{name}.npy'), np.ascontiguousarray(values), allow_pickle=False)
+    with open(os.path.join(staging_dir, 'manifest.json'), 'w') as f:
+        json.dump({'format': MAPPED_ARTIFACT_FORMAT, 'dataset': os.path.abspath(dataset_path),
+                   'rows': len(df), 'arrays': sorted(arrays)}, f, indent=2)
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    os.replace(staging_dir, output_dir)
+    save_monitoring_reference(df, output_dir)
+    return {name: len(values) for name, values in arrays.items()}
+
+
+def convert_model(model_path, output_path):
+    """Save a (pickled) CatBoost model in the native .cbm format"""
+    from inference import load_model
+
+    load_model(model_path).save_model(output_path, format='cbm')
+    return os.path.getsize(output_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the SafeIntel startup artifact from the training dataset')
+    parser.add_argument('--dataset', help='Input CSV (defaults to the path the API loads)')
+    parser.add_argument('--output', help='Output .npz path, or directory with --mapped')
+    parser.add_argument('--mapped', action='store_true',
+                        help='Write memory-mappable .npy arrays and convert the model to .cbm')
+    parser.add_argument('--model', help='Pickled model to convert with --mapped (defaults to the one the API loads)')
+    args = parser.parse_args(argv)
+
+    dataset_path = args.dataset or next((path for path in DEFAULT_DATASET_PATHS if os.path.exists(path)), None)
+    if dataset_path is None or not os.path.exists(dataset_path):
+        print("❌ Dataset not found, pass --dataset")
+        return 1
+
+    started = time.perf_counter()
+    if not args.mapped:
+        output = args.output or DEFAULT_ARTIFACT_PATHS[1]
+        sizes = build_startup_artifact(dataset_path, output)
+        print(f"✅ Startup artifact written to {output} in {time.perf_counter() - started:.2f}s")
+        for name, size in sizes.items():
+            if name.startswith('vocab_'):
+                print(f"   • {name}: {size} classes")
+        if 'known_keys' in sizes:
+            print(f"   • known devices: {sizes['known_keys']} distinct feature tuples")
+        return 0
+
+    output = args.output or DEFAULT_ARTIFACT_PATHS[0]
+    sizes = build_mapped_artifact(dataset_path, output)
+    print(f"✅ Mapped startup artifact written to {output} in {time.perf_counter() - started:.2f}s")
+    for name, size in sizes.items():
+        if name.startswith('vocab_'):
+            print(f"   • {name}: {size} classes")
+    if 'known_keys' in sizes:
+        print(f"   • known devices: {sizes['known_keys']} distinct feature tuples")
+
+    from inference import find_model_path, native_model_path
+    model_path = args.model or find_model_path()
+    if model_path is None or not os.path.exists(model_path):
+        print("⚠️ Model file not found, skipping the .cbm conversion (pass --model)")
+    elif model_path.endswith('.cbm'):
+        print(f"✅ Model is already in native format: {model_path}")
+    else:
+        cbm_path = native_model_path(model_path)
+        size = convert_model(model_path, cbm_path)
+        print(f"✅ Model converted to {cbm_path} ({size} bytes)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
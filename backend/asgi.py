@@ -0,0 +1,359 @@
+"""
+ASGI entry point for the SafeIntel API.
+
+The Flask routes run unchanged behind a small ASGI adapter: the event loop
+accepts connections and reads request bodies, and every request is handed
+to one of two bounded thread pools to run the WSGI app. /predict and
+/predict/batch go to the inference pool; everything else (/health,
+/metrics, /suggest, jobs, ...) to a separate pool, so health checks and
+scrapes are still answered while inference is saturated.
+
+Each pool accepts at most its worker count plus ASYNC_*_QUEUE requests.
+Beyond that the request is shed at once with 429 and a Retry-After
+estimated from recent service times, and a request that waited in the
+queue longer than ASYNC_QUEUE_TIMEOUT_MS gets 503 instead of running
+late. Latency therefore stays bounded under overload instead of growing
+with the backlog.
+
+Threads rather than processes: CatBoost releases the GIL while scoring,
+and the history, cache and monitoring state live in this process. Run
+several server workers to use more cores (with PREDICTION_HISTORY_SHARED=1).
+
+Usage:
+    uvicorn asgi:app --host 0.0.0.0 --port 8080
+    hypercorn asgi:app --bind 0.0.0.0:8080
+
+SAFEINTEL_APP selects the wrapped WSGI app as in serve.py, e.g. run:app to
+include the frontend (root run.py adds the static routes to backend/app.py's
+app, so its request hooks still run).
+"""
+
+import asyncio
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from serialization import dumps
+from serve import backend_module, check_application, import_target
+
+INFERENCE_PATHS = ('/predict',)
+
+INFERENCE_WORKERS = int(os.environ.get('ASYNC_INFERENCE_WORKERS', 8))
+INFERENCE_QUEUE = int(os.environ.get('ASYNC_INFERENCE_QUEUE', 64))
+IO_WORKERS = int(os.environ.get('ASYNC_IO_WORKERS', 8))
+IO_QUEUE = int(os.environ.get('ASYNC_IO_QUEUE', 128))
+QUEUE_TIMEOUT = float(os.environ.get('ASYNC_QUEUE_TIMEOUT_MS', 2000)) / 1000.0
+
+# Request bodies larger than this are spooled to a temporary file
+BODY_SPOOL_SIZE = 1024 * 1024
+# Responses larger than this (or without a Content-Length) are streamed chunk by chunk
+BUFFERED_RESPONSE_SIZE = 1024 * 1024
+
+
+class QueueTimeout(Exception):
+    """A request waited in the queue past its deadline"""
+
+
+class BoundedExecutor:
+    """Thread pool that admits at most workers + queue_depth requests"""
+
+    def __init__(self, name, workers, queue_depth, queue_timeout=None):
+        self.name = name
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_depth)
+        self.queue_timeout = queue_timeout or None
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f'asgi-{name}')
+        self._lock = threading.Lock()
+        self.pending = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Moving average of the time a request occupies a worker
+        self.service_seconds = 0.0
+
+    def full(self):
+        """Whether a new request would be shed; counts it as rejected if so"""
+        with self._lock:
+            if self.pending >= self.capacity:
+                self.rejected += 1
+                return True
+            return False
+
+    def try_acquire(self):
+        """Take a slot for one request, held until release()"""
+        with self._lock:
+            if self.pending >= self.capacity:
+                self.rejected += 1
+                return False
+            self.pending += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.pending -= 1
+
+    def _run(self, fn, args, enqueued):
+        if self.queue_timeout is not None and time.monotonic() - enqueued > self.queue_timeout:
+            with self._lock:
+                self.timed_out += 1
+            raise QueueTimeout()
+        started = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.completed += 1
+                self.service_seconds += (elapsed - self.service_seconds) * 0.1
+
+    def submit(self, fn, *args):
+        """Run a request's fn in the pool while it holds a slot; returns an awaitable"""
+        return asyncio.wrap_future(self._executor.submit(self._run, fn, args, time.monotonic()))
+
+    def run(self, fn, *args):
+        """Run follow-up work of a request that holds a slot (no queue deadline); returns an awaitable"""
+        return asyncio.wrap_future(self._executor.submit(fn, *args))
+
+    def retry_after(self):
+        """Whole seconds until the current backlog should have drained"""
+        return max(1, math.ceil(self.pending * self.service_seconds / self.workers))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'capacity': self.capacity,
+                'pending': self.pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'average_service_ms': self.service_seconds * 1000
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def wsgi_environ(scope, body, content_length):
+    """PEP 3333 environ for an ASGI http scope whose body was read into the file body"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        # The body has been read completely (and de-chunked), so its real length is known
+        'wsgi.input_terminated': True,
+        'CONTENT_LENGTH': str(content_length)
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_LENGTH', 'TRANSFER_ENCODING'):
+            continue
+        if name == 'CONTENT_TYPE':
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        if key in environ:
+            value = environ[key] + ('; ' if name == 'COOKIE' else ',') + value
+        environ[key] = value
+    return environ
+
+
+def call_wsgi(application, environ):
+    """Run the WSGI app; returns (status, headers, body chunks or an iterator to stream)"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        return lambda data: response.setdefault('written', []).append(data)
+
+    result = application(environ, start_response)
+    length = next((int(value) for name, value in response['headers'] if name == b'content-length'), None)
+    if length is not None and length <= BUFFERED_RESPONSE_SIZE:
+        try:
+            chunks = response.get('written', []) + list(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], chunks
+    return response['status'], response['headers'], (response.get('written', []), result)
+
+
+def _next_chunk(iterator):
+    return next(iterator, None)
+
+
+class AsgiAdapter:
+    """Serve a WSGI app over ASGI with bounded inference and I/O pools"""
+
+    def __init__(self, wsgi_app, load=None):
+        self.wsgi_app = wsgi_app
+        # Called once at lifespan startup, e.g. to load the model
+        self.load = load
+        self.inference = BoundedExecutor('inference', INFERENCE_WORKERS, INFERENCE_QUEUE, QUEUE_TIMEOUT)
+        self.io = BoundedExecutor('io', IO_WORKERS, IO_QUEUE, QUEUE_TIMEOUT)
+        self.draining = False
+
+    def pool_for(self, path):
+        return self.inference if path.startswith(INFERENCE_PATHS) else self.io
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self.handle_http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.handle_lifespan(receive, send)
+        elif scope['type'] == 'websocket':
+            await send({'type': 'websocket.close', 'code': 1003})
+
+    async def handle_lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    if self.load is not None:
+                        await asyncio.get_running_loop().run_in_executor(None, self.load)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # New requests get 503 while in-flight ones finish
+                self.draining = True
+                while self.inference.pending or self.io.pending:
+                    await asyncio.sleep(0.05)
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self.inference.shutdown)
+                await loop.run_in_executor(None, self.io.shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle_http(self, scope, receive, send):
+        pool = self.pool_for(scope['path'])
+        if self.draining:
+            await self.reject(send, 503, 'Server is shutting down', pool)
+            return
+        # Shed before reading the body; the slot is only taken once it has arrived
+        if pool.full():
+            await self.reject(send, 429, 'Too many requests in progress, retry later', pool)
+            return
+
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE)
+        try:
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                more_body = message.get('more_body', False)
+            content_length = body.tell()
+            body.seek(0)
+
+            if not pool.try_acquire():
+                await self.reject(send, 429, 'Too many requests in progress, retry later', pool)
+                return
+            try:
+                try:
+                    status, headers, chunks = await pool.submit(
+                        call_wsgi, self.wsgi_app, wsgi_environ(scope, body, content_length))
+                except QueueTimeout:
+                    await self.reject(send, 503, 'Request waited too long in the queue, retry later', pool)
+                    return
+
+                await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+                if isinstance(chunks, list):
+                    await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+                    return
+                await self.stream(send, pool, *chunks)
+            finally:
+                # Streamed responses keep their slot until the last chunk is sent
+                pool.release()
+        finally:
+            body.close()
+
+    async def stream(self, send, pool, written, result):
+        """Send a streamed WSGI body, pulling each chunk on one of the pool's threads"""
+        iterator = iter(result)
+        try:
+            for chunk in written:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            while True:
+                chunk = await pool.run(_next_chunk, iterator)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await pool.run(result.close)
+
+    async def reject(self, send, status, message, pool):
+        retry_after = pool.retry_after()
+        body = dumps({'error': message, 'retry_after': retry_after})
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+                        (b'retry-after', str(retry_after).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    def stats(self):
+        """Pool occupancy and shed requests, for /metrics/prom"""
+        return {'inference': self.inference.stats(), 'io': self.io.stats()}
+
+
+def load_backend():
+    backend = backend_module()
+    print(f"🚀 Loading model in process {os.getpid()}")
+    if backend.load_model_and_data():
+        print("✅ Application initialized successfully")
+    else:
+        print("⚠️ Application started with limited functionality")
+
+
+def create_app(target=None):
+    """ASGI app wrapping the WSGI app named by target ('module:attribute')"""
+    target = target or os.environ.get('SAFEINTEL_APP', 'app:app')
+    application = import_target(target)
+    if not check_application(application):
+        print(f"⚠️ {target} is not backend/app.py's app: its request hooks and orjson responses are missing")
+    adapter = AsgiAdapter(application, load_backend)
+    registry = backend_module().metrics_registry
+    registry.callback(
+        'safeintel_async_pending_requests', 'Requests queued or running in each ASGI pool',
+        lambda: {name: stats['pending'] for name, stats in adapter.stats().items()}, ['pool'])
+    registry.callback(
+        'safeintel_async_rejected_total', 'Requests shed with 429 because an ASGI pool was full',
+        lambda: {name: stats['rejected'] for name, stats in adapter.stats().items()}, ['pool'],
+        type_name='counter')
+    registry.callback(
+        'safeintel_async_queue_timeouts_total', 'Requests answered 503 after waiting past ASYNC_QUEUE_TIMEOUT_MS',
+        lambda: {name: stats['timed_out'] for name, stats in adapter.stats().items()}, ['pool'],
+        type_name='counter')
+    return adapter
+
+
+app = create_app()
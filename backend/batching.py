@@ -0,0 +1,112 @@
+"""
+Micro-batching scheduler for model inference.
+
+Concurrent /predict requests each hand their features to a MicroBatcher,
+which scores everything queued with one batched call and gives every
+waiting request its own row back. A request that finds the queue empty is
+scored at once; only when others are already queued does the batch wait a
+few milliseconds (or until max_batch_size rows are queued) for more.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from timing import clear_timer, record_stages, start_timer
+
+
+class MicroBatcher:
+    """Coalesce single predictions into batched model calls"""
+
+    def __init__(self, score_batch, max_wait_ms=2.0, max_batch_size=32):
+        # score_batch takes a list of feature dicts and returns one result per row
+        self.score_batch = score_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        self.batches_run = 0
+        self.rows_scored = 0
+
+    def submit(self, features):
+        """Queue one feature dict and return a Future for its result"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((features, future))
+        return future
+
+    def predict(self, features, timeout=None):
+        """Queue one feature dict and block until its batch has been scored"""
+        future = self.submit(features)
+        result = future.result(timeout)
+        # Stage timings of the shared batch call count towards every request in it
+        record_stages(getattr(future, 'stage_timings', None))
+        return result
+
+    def stats(self):
+        """Batching counters for /metrics"""
+        return {
+            'max_wait_ms': self.max_wait * 1000.0,
+            'max_batch_size': self.max_batch_size,
+            'batches_run': self.batches_run,
+            'rows_scored': self.rows_scored,
+            'average_batch_size': self.rows_scored / self.batches_run if self.batches_run else 0.0
+        }
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker_pid == pid and self._worker.is_alive():
+                return
+            if self._worker_pid != pid:
+                # Threads do not survive fork(); start over with a fresh queue
+                self._queue = queue.SimpleQueue()
+            self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+            self._worker.start()
+            self._worker_pid = pid
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Take whatever is already queued without waiting
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # A lone request is scored at once; wait for stragglers only under concurrent load
+            deadline = time.monotonic() + self.max_wait
+            while 1 < len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        timer = start_timer()
+        try:
+            results = self.score_batch([features for features, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            clear_timer()
+
+        self.batches_run += 1
+        self.rows_scored += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.stage_timings = timer.durations
+            future.set_result(result)
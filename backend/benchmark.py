@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+"""
+Load-testing and latency benchmark for the SafeIntel API.
+
+Replays device payloads sampled from the dataset against /predict,
+/predict/batch and /metrics, either in-process through Flask's test client
+or against a running server, at several concurrency levels. Reports
+throughput, p50/p95/p99 latency and the per-stage breakdown the API returns
+in its Server-Timing header, and saves everything as JSON so runs from
+different commits can be compared.
+
+Usage:
+    python benchmark.py                                   # in-process
+    python benchmark.py --url http://127.0.0.1:8080       # running server
+    python benchmark.py --concurrency 1,8,32 --requests 2000 --output bench.json
+    python benchmark.py --compare bench_main.json         # flag regressions
+    python benchmark.py --inference                       # model call micro-benchmark
+    python benchmark.py --rules                           # rule-based fallback micro-benchmark
+    python benchmark.py --serialization                   # request/response encoding micro-benchmark
+    python benchmark.py --stress --concurrency 1,8,32     # concurrent metrics/history consistency check
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from artifacts import CATEGORICAL_FEATURES, DEFAULT_DATASET_PATHS, find_startup_artifact, load_startup_artifact
+from timing import parse_server_timing
+
+ENDPOINTS = ('predict', 'batch', 'metrics')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the SafeIntel prediction API')
+    parser.add_argument('--url', help='Base URL of a running server (default: in-process test client)')
+    parser.add_argument('--endpoints', default='predict,batch,metrics',
+                        help=f"Comma-separated subset of {','.join(ENDPOINTS)}")
+    parser.add_argument('--concurrency', default='1,4,16', help='Comma-separated concurrency levels to sweep')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and concurrency level')
+    parser.add_argument('--batch-size', type=int, default=100, help='Rows per /predict/batch request')
+    parser.add_argument('--samples', type=int, default=2000, help='Distinct payloads sampled from the dataset')
+    parser.add_argument('--dataset', help='CSV to sample payloads from (defaults to the API dataset)')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests before each run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative p95 slowdown reported as a regression (default 0.2 = 20%%)')
+    parser.add_argument('--rules', action='store_true',
+                        help='Only micro-benchmark the rule-based fallback: the original if/elif chain '
+                             'versus the compiled decision table, per row and per column')
+    parser.add_argument('--inference', action='store_true',
+                        help='Only micro-benchmark the model call: DataFrame + predict + predict_proba '
+                             'versus the single-pass InferenceModel')
+    parser.add_argument('--serialization', action='store_true',
+                        help='Only micro-benchmark request parsing/validation and response encoding: '
+                             'stdlib json versus orjson and MessagePack')
+    parser.add_argument('--stress', action='store_true',
+                        help='Hammer /predict from --concurrency threads while polling /metrics and resetting it; '
+                             'fails if counters are ever inconsistent or predictions are lost')
+    return parser.parse_args(argv)
+
+
+# ---------------------------------------------------------------------------
+# Payloads
+# ---------------------------------------------------------------------------
+
+def sample_payloads(count, dataset_path=None, seed=0):
+    """Sample realistic /predict payloads from the dataset (or the startup artifact)"""
+    rng = random.Random(seed)
+    dataset_path = dataset_path or next((path for path in DEFAULT_DATASET_PATHS if os.path.exists(path)), None)
+
+    if dataset_path and os.path.exists(dataset_path):
+        import pandas as pd
+        df = pd.read_csv(dataset_path, usecols=lambda column: column in CATEGORICAL_FEATURES)
+        df = df.sample(n=min(count, len(df)), random_state=seed).fillna('')
+        return [{feature: str(row.get(feature, '')) for feature in CATEGORICAL_FEATURES}
+                for row in df.to_dict('records')]
+
+    artifact_path = find_startup_artifact()
+    if artifact_path is not None:
+        encoders, _, pair_counts = load_startup_artifact(artifact_path)
+        if pair_counts:
+            classifications = encoders['classification'].classes_.tolist() if 'classification' in encoders else ['']
+            implanted = encoders['implanted'].classes_.tolist() if 'implanted' in encoders else ['no']
+            return [{
+                'name': name,
+                'name_manufacturer': manufacturer,
+                'classification': rng.choice(classifications),
+                'implanted': rng.choice(implanted)
+            } for name, manufacturer, _ in rng.choices(pair_counts, k=count)]
+
+    print("⚠️ No dataset or startup artifact found, using synthetic payloads")
+    return [{
+        'name': f'Benchmark Device {rng.randint(0, 999)}',
+        'name_manufacturer': f'Manufacturer {rng.randint(0, 99)}',
+        'classification': rng.choice(['Class I', 'Class II', 'Class III']),
+        'implanted': rng.choice(['yes', 'no', 'unknown'])
+    } for _ in range(count)]
+
+
+# ---------------------------------------------------------------------------
+# Clients
+# ---------------------------------------------------------------------------
+
+class InProcessClient:
+    """Flask test client; one per thread"""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, data=body, content_type='application/json')
+        return response.status_code, response.headers.get('Server-Timing')
+
+    def request_json(self, method, path):
+        response = self.client.open(path, method=method)
+        return response.status_code, response.get_json()
+
+
+class HttpClient:
+    """Keep-alive HTTP connection; one per thread"""
+
+    def __init__(self, base_url):
+        parsed = urlparse(base_url)
+        self.base_path = parsed.path.rstrip('/')
+        self.connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=60)
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        self.connection.request(method, self.base_path + path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        return response.status, response.getheader('Server-Timing')
+
+    def request_json(self, method, path):
+        self.connection.request(method, self.base_path + path)
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read() or b'null')
+
+
+def make_client_factory(args):
+    if args.url:
+        return lambda: HttpClient(args.url)
+
+    # In-process: keep benchmark traffic out of the real history store and console
+    os.environ.setdefault('PREDICTION_HISTORY_DB', os.path.join(tempfile.mkdtemp(), 'benchmark_history.db'))
+    os.environ.setdefault('PREDICTION_LOG_LEVEL', 'WARNING')
+    import app as backend
+    backend.load_model_and_data()
+    return lambda: InProcessClient(backend.app)
+
+
+# ---------------------------------------------------------------------------
+# Runs
+# ---------------------------------------------------------------------------
+
+def build_requests(endpoint, payloads, count, batch_size, rng):
+    if endpoint == 'predict':
+        return [('POST', '/predict', json.dumps(rng.choice(payloads))) for _ in range(count)]
+    if endpoint == 'batch':
+        return [('POST', '/predict/batch', json.dumps(rng.sample(payloads, min(batch_size, len(payloads)))))
+                for _ in range(count)]
+    return [('GET', '/metrics', None) for _ in range(count)]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def summarize_stages(stage_samples, request_count):
+    stages = {}
+    for name, samples in stage_samples.items():
+        samples.sort()
+        stages[name] = {
+            'mean_ms': sum(samples) / request_count * 1000,
+            'p95_ms': percentile(samples, 0.95) * 1000,
+            'requests': len(samples)
+        }
+    return stages
+
+
+def run_level(endpoint, concurrency, requests, client_factory, warmup):
+    """Send requests[:warmup] unmeasured, then measure the rest"""
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = client_factory()
+        return local.client
+
+    def send(request):
+        method, path, body = request
+        started = time.perf_counter()
+        status, server_timing = client().request(method, path, body)
+        return time.perf_counter() - started, status, server_timing
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, requests[:warmup]))
+        started = time.perf_counter()
+        outcomes = list(executor.map(send, requests[warmup:]))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _, _ in outcomes)
+    errors = sum(1 for _, status, _ in outcomes if status >= 400)
+    stage_samples = {}
+    for _, _, server_timing in outcomes:
+        for name, seconds in parse_server_timing(server_timing).items():
+            stage_samples.setdefault(name, []).append(seconds)
+
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': len(outcomes),
+        'errors': errors,
+        'elapsed_s': elapsed,
+        'throughput_rps': len(outcomes) / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'max': latencies[-1] * 1000 if latencies else 0.0
+        },
+        'stages': summarize_stages(stage_samples, len(outcomes))
+    }
+
+
+def time_call(function, repeat):
+    function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def run_inference_benchmark(payloads, batch_sizes=(1, 32, 100), repeat=200):
+    """Compare the old two-call DataFrame path with InferenceModel.predict"""
+    os.environ.setdefault('PREDICTION_LOG_LEVEL', 'WARNING')
+    import pandas as pd
+    import app as backend
+    backend.load_model_and_data()
+    if backend.inference_model is None:
+        print("❌ No model loaded, nothing to benchmark")
+        return []
+
+    model = backend.model
+    columns = backend.FEATURE_COLUMNS
+    results = []
+    print("🚀 Inference micro-benchmark (microseconds per row)")
+    for batch_size in batch_sizes:
+        rows = payloads[:batch_size]
+
+        def two_calls():
+            test_data = pd.DataFrame(rows, columns=columns)
+            model.predict(test_data)
+            model.predict_proba(test_data)
+
+        def dataframe_single_pass():
+            model.predict_proba(pd.DataFrame(rows, columns=columns))
+
+        def inference_model():
+            backend.inference_model.predict(rows)
+
+        timings = {name: time_call(function, max(10, repeat // batch_size)) / len(rows) * 1e6
+                   for name, function in (('dataframe_predict_and_proba', two_calls),
+                                          ('dataframe_predict_proba', dataframe_single_pass),
+                                          ('inference_model', inference_model))}
+        speedup = timings['dataframe_predict_and_proba'] / timings['inference_model']
+        print(f"   • batch {len(rows):<4} two calls {timings['dataframe_predict_and_proba']:8.1f} µs  "
+              f"DataFrame single pass {timings['dataframe_predict_proba']:8.1f} µs  "
+              f"InferenceModel {timings['inference_model']:8.1f} µs  ({speedup:.1f}x)")
+        results.append({'batch_size': len(rows), 'us_per_row': timings, 'speedup': speedup})
+    return results
+
+
+def legacy_rule_based_prediction(features):
+    """The if/elif chain the decision table in rules.py replaced, kept for comparison"""
+    classification = features.get('classification', '').lower()
+    implanted = features.get('implanted', 'no').lower()
+    if implanted == 'unknown':
+        return '3', 0.75
+    elif implanted == 'yes':
+        return '1', 0.92
+    elif 'class iii' in classification or 'high' in classification:
+        return '1', 0.88
+    elif 'class ii' in classification or 'medium' in classification:
+        return '2', 0.84
+    elif implanted == 'no':
+        return '3', 0.80
+    return '3', 0.72
+
+
+# Inputs where a loosely anchored pattern would disagree with the chain's == comparisons
+RULE_EDGE_CASES = [
+    {'classification': '', 'implanted': 'yes\n'},
+    {'classification': '', 'implanted': 'no\n'},
+    {'classification': 'Class I', 'implanted': 'unknown\n'},
+    {'classification': 'Class III\n', 'implanted': ' yes'},
+    {'classification': 'medium', 'implanted': 'YES'},
+    {'classification': 'class ii', 'implanted': ''}
+]
+
+
+def run_rules_benchmark(payloads, row_counts=(1, 100, 10000, 100000)):
+    """Compare the original rule chain with DecisionTable per row and per column"""
+    import pandas as pd
+    from rules import DECISION_TABLE, simple_rule_based_prediction
+
+    checked = list(payloads) + RULE_EDGE_CASES
+    expected = [legacy_rule_based_prediction(p) for p in checked]
+    severities, confidences, _ = DECISION_TABLE.predict_columns(pd.DataFrame(checked))
+    mismatches = sum(expected[i] != simple_rule_based_prediction(p)
+                     or expected[i] != (severities[i], confidences[i]) for i, p in enumerate(checked))
+    if mismatches:
+        print(f"❌ Decision table disagrees with the original rules on {mismatches} payloads")
+        return []
+
+    results = []
+    print("🚀 Rule-based fallback micro-benchmark (microseconds per row)")
+    for row_count in row_counts:
+        rows = [payloads[i % len(payloads)] for i in range(row_count)]
+        frame = pd.DataFrame(rows)
+        repeat = max(3, 20000 // row_count)
+        timings = {
+            'legacy_chain': time_call(lambda: [legacy_rule_based_prediction(row) for row in rows], repeat),
+            'table_per_row': time_call(lambda: [simple_rule_based_prediction(row) for row in rows], repeat),
+            'table_columns': time_call(lambda: DECISION_TABLE.predict_columns(frame), repeat)
+        }
+        timings = {name: seconds / row_count * 1e6 for name, seconds in timings.items()}
+        print(f"   • {row_count:<7} rows  if/elif chain {timings['legacy_chain']:6.2f} µs  "
+              f"table per row {timings['table_per_row']:6.2f} µs  table on columns {timings['table_columns']:8.2f} µs")
+        results.append({'rows': row_count, 'us_per_row': timings})
+    return results
+
+
+def legacy_extract_features(data):
+    return {
+        'name': str(data.get('name', '')),
+        'name_manufacturer': str(data.get('name_manufacturer', '')),
+        'classification': str(data.get('classification', '')),
+        'implanted': str(data.get('implanted', 'no')).lower()
+    }
+
+
+def run_serialization_benchmark(payloads, summary_rows=1000, batch_size=100):
+    """Compare stdlib json with orjson and MessagePack on the API's request and response shapes"""
+    import serialization
+
+    predictions = [{'prediction': '2', 'confidence': 0.8731, 'method': 'catboost_model_6'}
+                   for _ in range(batch_size)]
+    history = [{
+        'id': i, 'timestamp': '2026-01-01 12:00:00',
+        'device_name': payloads[i % len(payloads)].get('name', ''),
+        'manufacturer': payloads[i % len(payloads)].get('name_manufacturer', ''),
+        'classification': payloads[i % len(payloads)].get('classification', ''),
+        'implanted': payloads[i % len(payloads)].get('implanted', ''),
+        'predicted_class': '2', 'confidence': 0.8731, 'method': 'catboost_model_6'
+    } for i in range(summary_rows)]
+    responses = {
+        'predict': dict(predictions[0], prediction_count=12345),
+        f'batch_{batch_size}': {'predictions': predictions, 'count': batch_size},
+        f'summary_{summary_rows}': {'total_predictions': summary_rows, 'count': summary_rows, 'predictions': history}
+    }
+
+    encoders = {'stdlib_json': lambda value: json.dumps(value).encode('utf-8')}
+    if serialization.orjson is not None:
+        encoders['orjson'] = serialization.dumps
+    if serialization.msgpack is not None:
+        encoders['msgpack'] = serialization.pack
+    if len(encoders) == 1:
+        print("⚠️ Neither orjson nor msgpack is installed; only stdlib json is measured")
+
+    results = {'responses': {}, 'requests': {}}
+    print("🚀 Serialization micro-benchmark (microseconds per call)")
+    for name, value in responses.items():
+        repeat = max(20, 20000 // len(encoders['stdlib_json'](value)) * 10)
+        timings = {encoder: time_call(lambda: encode(value), repeat) * 1e6 for encoder, encode in encoders.items()}
+        sizes = {encoder: len(encode(value)) for encoder, encode in encoders.items()}
+        print(f"   • {name:<13} " + "  ".join(f"{encoder} {timings[encoder]:8.1f} µs ({sizes[encoder]} B)"
+                                              for encoder in encoders))
+        results['responses'][name] = {'us': timings, 'bytes': sizes}
+
+    bodies = [json.dumps(payload).encode('utf-8') for payload in payloads[:1000]]
+    parse = {
+        'stdlib_json_unchecked': lambda: [legacy_extract_features(json.loads(body)) for body in bodies],
+        'loads_and_schema': lambda: [serialization.DEVICE_SCHEMA.validate(serialization.loads(body))
+                                     for body in bodies]
+    }
+    timings = {name: time_call(function, 20) / len(bodies) * 1e6 for name, function in parse.items()}
+    print(f"   • /predict body  json.loads + str() {timings['stdlib_json_unchecked']:6.2f} µs  "
+          f"loads + DEVICE_SCHEMA {timings['loads_and_schema']:6.2f} µs")
+    results['requests'] = {'us_per_record': timings}
+    return results
+
+
+def metrics_total(client):
+    """/metrics total_predictions, after checking it against both distributions; raises AssertionError"""
+    status, metrics = client.request_json('GET', '/metrics')
+    assert status == 200, f'/metrics returned {status}'
+    total = metrics.get('total_predictions', 0)
+    by_class = sum(metrics.get('prediction_distribution', {}).values())
+    by_method = sum(metrics.get('method_distribution', {}).values())
+    assert total == by_class == by_method, \
+        f'torn /metrics read: total {total}, by class {by_class}, by method {by_method}'
+    return total
+
+
+def run_stress_level(concurrency, requests, payloads, client_factory, rng, reset_midway):
+    """One stress round; returns (result dict, list of violations)"""
+    bodies = [json.dumps(rng.choice(payloads)) for _ in range(requests)]
+    control = client_factory()
+    control.request('POST', '/reset_metrics')
+    violations = []
+    done = threading.Event()
+    reads = []
+    succeeded = []
+
+    def write(worker):
+        client = client_factory()
+        ok = 0
+        for body in bodies[worker::concurrency]:
+            status, _ = client.request('POST', '/predict', body)
+            ok += status == 200
+        succeeded.append(ok)
+
+    def read():
+        client = client_factory()
+        previous = 0
+        while not done.is_set():
+            started = time.perf_counter()
+            try:
+                total = metrics_total(client)
+                # Totals only move backwards across a reset
+                if not reset_midway and total < previous:
+                    violations.append(f'/metrics went backwards: {previous} -> {total}')
+                previous = total
+            except AssertionError as e:
+                violations.append(str(e))
+            reads.append(time.perf_counter() - started)
+            time.sleep(0.002)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    writers = [threading.Thread(target=write, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in writers:
+        thread.start()
+    if reset_midway:
+        # Reset once about half the predictions have been counted
+        while metrics_total(control) < requests // 2 and any(thread.is_alive() for thread in writers):
+            time.sleep(0.001)
+        control.request('POST', '/reset_metrics')
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    reader.join()
+
+    total = metrics_total(control)
+    _, health = control.request_json('GET', '/health')
+    stored = health['total_predictions']
+    if reset_midway:
+        # Predictions racing the reset may land on either side of it, but counters and store must agree
+        if total != stored or total > sum(succeeded):
+            violations.append(f'after reset: /metrics {total}, stored {stored}, served {sum(succeeded)}')
+    elif not total == stored == sum(succeeded):
+        violations.append(f'lost updates: /metrics {total}, stored {stored}, served {sum(succeeded)}')
+
+    reads.sort()
+    return {
+        'concurrency': concurrency,
+        'reset_midway': reset_midway,
+        'requests': requests,
+        'errors': requests - sum(succeeded),
+        'throughput_rps': requests / elapsed if elapsed else 0.0,
+        'metrics_reads': len(reads),
+        'metrics_latency_ms': {'p50': percentile(reads, 0.50) * 1000, 'p99': percentile(reads, 0.99) * 1000},
+        'violations': len(violations)
+    }, violations
+
+
+def run_stress(levels, requests, payloads, client_factory, rng):
+    """Stress every concurrency level, with and without a reset under load"""
+    results = []
+    failures = 0
+    print("🚀 Concurrency stress test: /predict writers, a /metrics poller and /reset_metrics")
+    for concurrency in levels:
+        for reset_midway in (False, True):
+            result, violations = run_stress_level(concurrency, requests, payloads, client_factory, rng, reset_midway)
+            latency = result['metrics_latency_ms']
+            print(f"   • c={concurrency:<3} {'reset under load' if reset_midway else 'no reset':<16} "
+                  f"{result['throughput_rps']:8.1f} req/s  /metrics p50 {latency['p50']:6.2f} ms  "
+                  f"p99 {latency['p99']:6.2f} ms  reads {result['metrics_reads']:<5} errors {result['errors']}  "
+                  f"{'✅ consistent' if not violations else '❌ ' + violations[0]}")
+            failures += len(violations)
+            results.append(result)
+    return results, failures
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def print_result(result):
+    latency = result['latency_ms']
+    print(f"   • {result['endpoint']:<8} c={result['concurrency']:<3} "
+          f"{result['throughput_rps']:8.1f} req/s  "
+          f"p50 {latency['p50']:7.2f} ms  p95 {latency['p95']:7.2f} ms  p99 {latency['p99']:7.2f} ms  "
+          f"errors {result['errors']}")
+    for name, stats in result['stages'].items():
+        print(f"       - {name:<14} mean {stats['mean_ms']:7.3f} ms  p95 {stats['p95_ms']:7.3f} ms")
+
+
+def compare_results(results, mode, baseline_path, threshold):
+    """Print changes against a baseline run and return the number of regressions"""
+    with open(baseline_path) as f:
+        previous = json.load(f)
+    baseline = {(r['endpoint'], r['concurrency']): r for r in previous['results']}
+
+    regressions = 0
+    print(f"\n📊 Compared with {baseline_path} (commit {previous['meta'].get('commit')}):")
+    if previous['meta'].get('mode') != mode:
+        print(f"   ⚠️ Baseline was measured {previous['meta'].get('mode')}, this run is {mode}")
+    for result in results:
+        before = baseline.get((result['endpoint'], result['concurrency']))
+        if before is None:
+            continue
+        p95_change = result['latency_ms']['p95'] / before['latency_ms']['p95'] - 1 if before['latency_ms']['p95'] else 0.0
+        rps_change = result['throughput_rps'] / before['throughput_rps'] - 1 if before['throughput_rps'] else 0.0
+        regressed = p95_change > threshold
+        regressions += regressed
+        print(f"   {'❌' if regressed else '✅'} {result['endpoint']:<8} c={result['concurrency']:<3} "
+              f"p95 {p95_change:+.1%}  throughput {rps_change:+.1%}")
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(',') if endpoint.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        print(f"❌ Unknown endpoints: {', '.join(sorted(unknown))}")
+        return 2
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    rng = random.Random(args.seed)
+    payloads = sample_payloads(args.samples, args.dataset, args.seed)
+    if args.rules:
+        results = run_rules_benchmark(payloads)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'meta': {'commit': git_commit(), 'mode': 'rules'}, 'rules': results}, f, indent=2)
+        return 0 if results else 1
+    if args.serialization:
+        results = run_serialization_benchmark(payloads, batch_size=args.batch_size)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'meta': {'commit': git_commit(), 'mode': 'serialization'}, 'serialization': results},
+                          f, indent=2)
+        return 0
+    if args.stress:
+        results, failures = run_stress(levels, args.requests, payloads, make_client_factory(args), rng)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'meta': {'commit': git_commit(), 'mode': 'stress'}, 'stress': results}, f, indent=2)
+        return 1 if failures else 0
+    if args.inference:
+        results = run_inference_benchmark(payloads)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'meta': {'commit': git_commit(), 'mode': 'inference'}, 'inference': results}, f, indent=2)
+        return 0 if results else 1
+    client_factory = make_client_factory(args)
+    mode = 'http' if args.url else 'in-process'
+
+    print(f"🚀 Benchmarking {args.url or 'in-process app'} with {len(payloads)} sampled payloads")
+    results = []
+    for endpoint in endpoints:
+        for concurrency in levels:
+            requests = build_requests(endpoint, payloads, args.requests + args.warmup, args.batch_size, rng)
+            result = run_level(endpoint, concurrency, requests, client_factory, args.warmup)
+            if endpoint == 'batch':
+                result['rows_per_s'] = result['throughput_rps'] * args.batch_size
+            print_result(result)
+            results.append(result)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'mode': mode,
+            'url': args.url,
+            'python': platform.python_version(),
+            'requests_per_level': args.requests,
+            'batch_size': args.batch_size
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results saved to {args.output}")
+
+    if args.compare:
+        return 1 if compare_results(results, mode, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Offline bulk scoring of a device catalogue.
+
+Streams a CSV, NDJSON or Parquet file in chunks, scores the chunks in a
+pool of worker processes that each load the model once, and appends
+predictions and class probabilities to the output as chunks complete. Only
+a bounded number of chunks are in flight at any time, so memory stays flat
+regardless of the input size.
+
+Progress is checkpointed next to the output after every chunk; rerun with
+--resume to continue an interrupted run where it stopped.
+
+Usage:
+    python bulk_score.py ../dataset/master_v5.csv --output scores.csv
+    python bulk_score.py combined_v11_fixed.csv --output scores.csv --workers 4 --chunksize 20000
+    python bulk_score.py combined_v11_fixed.csv --output scores.csv --resume
+    python bulk_score.py catalogue.parquet --output scores.parquet      # directory of part files
+    python bulk_score.py catalogue.ndjson --output scores.csv           # one JSON record per line
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from artifacts import CATEGORICAL_FEATURES
+from inference import MODEL_METHOD, InferenceModel, boost_confidences, find_model_path, load_model
+from rules import DECISION_TABLE, RULES
+from serialization import DEVICE_SCHEMA
+
+# Set in each worker process by init_worker
+_scorer = None
+
+# Probability columns written when no model is available
+RULE_CLASSES = sorted({rule.severity for rule in RULES})
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Score a device catalogue offline with the CatBoost model')
+    parser.add_argument('input', help='CSV, NDJSON (.ndjson/.jsonl) or Parquet file to score')
+    parser.add_argument('--output', required=True,
+                        help='Output CSV file, or a directory of Parquet parts if it ends in .parquet')
+    parser.add_argument('--model', help='Model file (defaults to the one the API loads)')
+    parser.add_argument('--chunksize', type=int, default=10000, help='Rows per chunk')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--max-pending', type=int,
+                        help='Chunks in flight at once (default: 2 per worker); bounds memory use')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run from its checkpoint')
+    return parser.parse_args(argv)
+
+
+# ---------------------------------------------------------------------------
+# Workers
+# ---------------------------------------------------------------------------
+
+def init_worker(model_path, thread_count):
+    """Load the model once per worker process"""
+    global _scorer
+    _scorer = InferenceModel(load_model(model_path), CATEGORICAL_FEATURES, thread_count=thread_count)
+
+
+def score_chunk(first_row, chunk):
+    """Score one chunk in a worker process"""
+    return score_frame(_scorer, first_row, chunk)
+
+
+def score_frame(scorer, first_row, chunk):
+    """Score one chunk of features with an InferenceModel (or the rule table if None); returns a DataFrame"""
+    # Same defaults and normalization as extract_features() in app.py
+    chunk = DEVICE_SCHEMA.normalize_frame(chunk)
+
+    if scorer is not None:
+        scores = scorer.score_rows(chunk.values.tolist())
+        classes = np.array(scorer.classes, dtype=object)
+        probability_matrix, row_is_valid = scores.probabilities, scores.valid
+        predictions = scores.labels
+        confidences = boost_confidences(scores.confidences)
+    else:
+        classes = np.array(RULE_CLASSES, dtype=object)
+        probability_matrix = np.full((len(chunk), len(RULE_CLASSES)), np.nan)
+        row_is_valid = np.zeros(len(chunk), dtype=bool)
+        predictions = np.empty(len(chunk), dtype=object)
+        confidences = np.zeros(len(chunk))
+    methods = np.full(len(chunk), MODEL_METHOD, dtype=object)
+    if not row_is_valid.all():
+        # Rows the model cannot score go through the rule table in one vectorized pass
+        invalid = ~row_is_valid
+        predictions[invalid], confidences[invalid], _ = DECISION_TABLE.predict_columns(chunk[invalid])
+        methods[invalid] = 'rule-based'
+
+    result = chunk.copy()
+    result.insert(0, 'row', np.arange(first_row, first_row + len(chunk)))
+    result['prediction'] = predictions
+    result['confidence'] = confidences
+    result['method'] = methods
+    for column, label in enumerate(classes):
+        result[f'probability_{label}'] = probability_matrix[:, column]
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Input and output
+# ---------------------------------------------------------------------------
+
+def iter_chunks(path, chunksize, skip_rows):
+    """Yield DataFrames of at most chunksize rows, after skipping skip_rows rows"""
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌ Reading Parquet requires pyarrow (pip install pyarrow)")
+        parquet_file = pq.ParquetFile(path)
+        columns = [column for column in CATEGORICAL_FEATURES if column in parquet_file.schema_arrow.names]
+        # Batches can be shorter than chunksize at row-group boundaries, so count the rows
+        rows_read = 0
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            rows_read += batch.num_rows
+            if rows_read > skip_rows:
+                yield batch.slice(max(0, skip_rows - (rows_read - batch.num_rows))).to_pandas()
+        return
+
+    import pandas as pd
+    if path.endswith(('.ndjson', '.jsonl')):
+        reader = pd.read_json(path, lines=True, chunksize=chunksize, dtype=False)
+        rows_read = 0
+        for chunk in reader:
+            rows_read += len(chunk)
+            if rows_read > skip_rows:
+                yield chunk.iloc[max(0, skip_rows - (rows_read - len(chunk))):].reindex(columns=CATEGORICAL_FEATURES)
+        return
+
+    reader = pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False,
+                         usecols=lambda column: column in CATEGORICAL_FEATURES,
+                         skiprows=range(1, skip_rows + 1) if skip_rows else None)
+    for chunk in reader:
+        yield chunk
+
+
+class CsvOutput:
+    """Appends results to one CSV file; resuming truncates it to the last checkpoint"""
+
+    def __init__(self, path, resume_bytes):
+        mode = 'r+' if resume_bytes else 'w'
+        self.file = open(path, mode, newline='', encoding='utf-8')
+        self.file.truncate(resume_bytes)
+        self.file.seek(resume_bytes)
+
+    def write(self, chunk_index, result):
+        result.to_csv(self.file, header=self.file.tell() == 0, index=False)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetOutput:
+    """One Parquet part file per chunk, written atomically"""
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def write(self, chunk_index, result):
+        part = os.path.join(self.path, f'part-{chunk_index:05d}.parquet')
+        result.to_parquet(part + '.tmp', index=False)
+        os.replace(part + '.tmp', part)
+        return 0
+
+    def close(self):
+        pass
+
+
+def progress_path(output):
+    return output.rstrip('/\\') + '.progress.json'
+
+
+def load_progress(args):
+    """Checkpoint of an earlier run of the same job, or a fresh one"""
+    fresh = {'input': os.path.abspath(args.input), 'chunksize': args.chunksize,
+             'chunks_done': 0, 'rows_done': 0, 'output_bytes': 0, 'complete': False}
+    path = progress_path(args.output)
+    if not args.resume or not os.path.exists(path):
+        if args.resume:
+            print("⚠️ No checkpoint found, starting from the beginning")
+        return fresh
+
+    with open(path) as f:
+        progress = json.load(f)
+    if progress['input'] != fresh['input'] or progress['chunksize'] != args.chunksize:
+        raise SystemExit(f"❌ Checkpoint {path} belongs to {progress['input']} with chunksize "
+                         f"{progress['chunksize']}; rerun with the same input and --chunksize")
+    return progress
+
+
+def save_progress(output, progress):
+    path = progress_path(output)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(progress, f)
+    os.replace(path + '.tmp', path)
+
+
+# ---------------------------------------------------------------------------
+# Main loop
+# ---------------------------------------------------------------------------
+
+def main(argv=None):
+    args = parse_args(argv)
+    model_path = args.model or find_model_path()
+    if model_path is None or not os.path.exists(model_path):
+        print("❌ Model file not found")
+        return 1
+    if not os.path.exists(args.input):
+        print(f"❌ Input not found: {args.input}")
+        return 1
+
+    progress = load_progress(args)
+    if progress['complete']:
+        print(f"✅ {args.output} is already complete ({progress['rows_done']} rows)")
+        return 0
+    if progress['rows_done']:
+        print(f"↩️ Resuming after {progress['rows_done']} rows ({progress['chunks_done']} chunks)")
+
+    workers = max(1, args.workers)
+    max_pending = args.max_pending or workers * 2
+    thread_count = max(1, (os.cpu_count() or 1) // workers)
+    if args.output.endswith('.parquet'):
+        output = ParquetOutput(args.output)
+    else:
+        output = CsvOutput(args.output, progress['output_bytes'])
+
+    print(f"🚀 Scoring {args.input} with {workers} workers, {args.chunksize} rows per chunk")
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                       initargs=(model_path, thread_count))
+    else:
+        executor = None
+        init_worker(model_path, thread_count)
+
+    started = time.perf_counter()
+    rows_scored = 0
+    pending = deque()
+
+    def write_oldest():
+        nonlocal rows_scored
+        chunk_index, future = pending.popleft()
+        result = future.result()
+        progress['output_bytes'] = output.write(chunk_index, result)
+        progress['chunks_done'] = chunk_index + 1
+        progress['rows_done'] += len(result)
+        save_progress(args.output, progress)
+        rows_scored += len(result)
+        elapsed = time.perf_counter() - started
+        print(f"   • chunk {chunk_index}: {progress['rows_done']} rows written "
+              f"({rows_scored / elapsed:.0f} rows/s)")
+
+    try:
+        chunk_index = progress['chunks_done']
+        first_row = progress['rows_done']
+        for chunk in iter_chunks(args.input, args.chunksize, progress['rows_done']):
+            if executor is not None:
+                future = executor.submit(score_chunk, first_row, chunk)
+            else:
+                future = Future()
+                future.set_result(score_chunk(first_row, chunk))
+            pending.append((chunk_index, future))
+            chunk_index += 1
+            first_row += len(chunk)
+            # Results are written in input order; waiting here bounds what is held in memory
+            while len(pending) >= max_pending:
+                write_oldest()
+        while pending:
+            write_oldest()
+    except KeyboardInterrupt:
+        print(f"\n⏸️ Interrupted after {progress['rows_done']} rows; rerun with --resume to continue")
+        return 130
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        output.close()
+
+    progress['complete'] = True
+    save_progress(args.output, progress)
+    elapsed = time.perf_counter() - started
+    print(f"✅ Scored {rows_scored} rows in {elapsed:.1f}s; {progress['rows_done']} rows in {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
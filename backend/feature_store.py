@@ -0,0 +1,45 @@
+"""
+Sorted vocabularies of the model's categorical features.
+
+Each vocabulary is interned and sorted (the same ordering LabelEncoder
+would produce). Only the vocabularies are kept; the dataset they were read
+from can be dropped right away. Nothing in the API encodes rows into
+integer codes (CatBoost takes the raw strings), so no code arrays or
+lookup tables are built.
+"""
+
+import sys
+
+import numpy as np
+
+
+class Vocabulary:
+    """Sorted category vocabulary exposing LabelEncoder's classes_"""
+
+    def __init__(self, classes):
+        # Interned so every copy of a value shares one string
+        self.classes_ = np.array([sys.intern(str(value)) for value in classes], dtype=object)
+
+    def __len__(self):
+        return len(self.classes_)
+
+
+class MappedVocabulary:
+    """Vocabulary over a sorted string array (typically memory-mapped)"""
+
+    def __init__(self, classes):
+        # No per-value Python objects: processes mapping the same file share its pages
+        self.classes_ = classes
+
+    def __len__(self):
+        return len(self.classes_)
+
+
+def vocabularies_from_dataframe(df, features, fill_value='Unknown'):
+    """{feature: Vocabulary} for the given columns of df; the caller can drop df afterwards"""
+    # Same classes LabelEncoder.fit() would produce
+    return {
+        feature: Vocabulary(np.unique(df[feature].fillna(fill_value).astype(str).to_numpy(dtype=str)))
+        for feature in features
+        if feature in df.columns
+    }
@@ -0,0 +1,416 @@
+"""
+Prediction history storage.
+
+Keeps the most recent predictions in a bounded in-memory ring of compact
+__slots__ records and writes every prediction to an append-only SQLite
+store, so memory stays flat on long-running instances and the history
+survives restarts.
+
+With shared=True several worker processes write the same store; running
+aggregates then fold in every worker's records from the store on read, so
+/metrics reports totals across all workers.
+
+Only writes to the store are serialized. Readers never wait for them: the
+ring is read lock-free, counters come from a snapshot of the sharded
+aggregates, and store queries use their own pooled connections (WAL mode
+lets them run alongside the writer).
+"""
+
+import os
+import sqlite3
+import threading
+from array import array
+
+from aggregates import FEATURE_NAMES, PredictionAggregates
+
+
+class PredictionRecord:
+    """A single stored prediction"""
+
+    __slots__ = ('id', 'timestamp', 'name', 'name_manufacturer', 'classification',
+                 'implanted', 'prediction', 'confidence', 'method', 'probabilities')
+
+    def __init__(self, id, timestamp, name, name_manufacturer, classification,
+                 implanted, prediction, confidence, method, probabilities=None):
+        self.id = id
+        self.timestamp = timestamp
+        self.name = name
+        self.name_manufacturer = name_manufacturer
+        self.classification = classification
+        self.implanted = implanted
+        self.prediction = prediction
+        self.confidence = confidence
+        self.method = method
+        self.probabilities = probabilities
+
+    @property
+    def features(self):
+        return {
+            'name': self.name,
+            'name_manufacturer': self.name_manufacturer,
+            'classification': self.classification,
+            'implanted': self.implanted
+        }
+
+    @classmethod
+    def from_row(cls, row):
+        record = cls(*row)
+        if record.probabilities is not None:
+            probabilities = array('d')
+            probabilities.frombytes(record.probabilities)
+            record.probabilities = probabilities.tolist()
+        return record
+
+
+class RecordRing:
+    """Fixed-size ring of the newest records; one writer at a time, readers never block"""
+
+    def __init__(self, size, records=()):
+        self.size = size
+        # One spare slot takes the write in flight, so the newest `size` records stay readable
+        self._slots = [None] * (size + 1)
+        self._count = 0  # records ever appended
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return min(self._count, self.size)
+
+    def append(self, record):
+        # The slot is filled before the count moves, so readers never see an empty slot
+        self._slots[self._count % len(self._slots)] = record
+        self._count += 1
+
+    def snapshot(self, count=None):
+        """The newest `count` records (all by default), oldest first"""
+        slots = len(self._slots)
+        end = self._count
+        count = min(end, self.size) if count is None else min(count, end, self.size)
+        if count <= 0:
+            return []
+        start = end - count
+        first, last = start % slots, end % slots
+        records = self._slots[first:last] if first < last else self._slots[first:] + self._slots[:last]
+        # Writers may have wrapped around while we copied: every append counted since, plus one
+        # that may have filled its slot without being counted yet, replaced the oldest slots
+        overwritten = self._count + 1 - slots - start
+        return records[overwritten:] if overwritten > 0 else records
+
+    def find(self, record_id):
+        records = self.snapshot()
+        if records and records[0].id <= record_id <= records[-1].id:
+            offset = record_id - records[0].id
+            if offset < len(records) and records[offset].id == record_id:
+                return records[offset]
+        return None
+
+
+_COLUMNS = ('id, timestamp, name, name_manufacturer, classification, implanted, '
+            'prediction, confidence, method, probabilities')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    name TEXT,
+    name_manufacturer TEXT,
+    classification TEXT,
+    implanted TEXT,
+    prediction TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    method TEXT NOT NULL,
+    probabilities BLOB
+);
+CREATE TABLE IF NOT EXISTS history_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO history_meta (key, value) VALUES ('generation', 0);
+"""
+
+
+class PredictionHistory:
+    """Bounded in-memory ring of recent predictions over an on-disk store"""
+
+    def __init__(self, db_path, ring_size=1000, top_k_capacity=50, shared=False):
+        self.db_path = db_path
+        self.ring_size = ring_size
+        self.shared = shared
+
+        # Serializes writes to the store (and opening it); readers do not take it
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._readers = []
+        self._ring = RecordRing(ring_size)
+        self._size = 0
+        self._aggregates = PredictionAggregates(top_k_capacity=top_k_capacity)
+        # Highest id folded into the aggregates, and the reset generation they belong to
+        self._folded_through = -1
+        self._generation = 0
+
+    def _connection(self):
+        # Called with self._lock held. SQLite handles must not cross fork()
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        conn.commit()
+        self._load_state(conn)
+
+        self._readers = []
+        self._conn = conn
+        self._conn_pid = os.getpid()
+        return conn
+
+    def _ensure_open(self):
+        if self._conn_pid != os.getpid():
+            with self._lock:
+                self._connection()
+
+    def _read(self, query, params):
+        """Rows of a read-only query, on a pooled connection of its own"""
+        self._ensure_open()
+        readers = self._readers
+        try:
+            conn = readers.pop()
+        except IndexError:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        try:
+            return conn.execute(query, params).fetchall()
+        finally:
+            readers.append(conn)
+
+    def _load_state(self, conn):
+        # One pass over stored history at startup; afterwards counters are updated
+        # per append (or folded in from the store in shared mode). Read everything
+        # from one snapshot so concurrent writers cannot skew the totals.
+        conn.execute('BEGIN')
+        try:
+            self._generation = conn.execute(
+                "SELECT value FROM history_meta WHERE key = 'generation'"
+            ).fetchone()[0]
+            last_id = conn.execute('SELECT MAX(id) FROM predictions').fetchone()[0]
+            self._size = last_id + 1 if last_id is not None else 0
+            self._folded_through = last_id if last_id is not None else -1
+
+            # Warm the ring with the newest stored records
+            rows = conn.execute(
+                f'SELECT {_COLUMNS} FROM predictions ORDER BY id DESC LIMIT ?', (self.ring_size,)
+            ).fetchall()
+            self._ring = RecordRing(self.ring_size, (PredictionRecord.from_row(row) for row in reversed(rows)))
+            self._seed_aggregates(conn)
+        finally:
+            conn.commit()
+
+    def _seed_aggregates(self, conn):
+        total, confidence_sum = conn.execute(
+            'SELECT COUNT(*), IFNULL(SUM(confidence), 0) FROM predictions'
+        ).fetchone()
+        prediction_counts = conn.execute(
+            'SELECT prediction, COUNT(*) FROM predictions GROUP BY prediction'
+        ).fetchall()
+        method_counts = conn.execute(
+            'SELECT method, COUNT(*) FROM predictions GROUP BY method'
+        ).fetchall()
+        feature_counts = {
+            feature: conn.execute(
+                f'SELECT {feature}, COUNT(*) AS n FROM predictions GROUP BY {feature} ORDER BY n DESC LIMIT ?',
+                (self._aggregates.top_k_capacity,)
+            ).fetchall()
+            for feature in FEATURE_NAMES
+        }
+        self._aggregates.seed(total, confidence_sum, prediction_counts, method_counts,
+                              feature_counts, self._ring.snapshot(self._aggregates.recent_size))
+
+    def _catch_up(self, conn):
+        # Shared mode: fold in records other workers have written since the last read
+        generation = conn.execute("SELECT value FROM history_meta WHERE key = 'generation'").fetchone()[0]
+        if generation != self._generation:
+            # Another worker reset the history
+            self._load_state(conn)
+            return
+        rows = conn.execute(
+            f'SELECT {_COLUMNS} FROM predictions WHERE id > ? ORDER BY id', (self._folded_through,)
+        ).fetchall()
+        for row in rows:
+            self._aggregates.add(PredictionRecord.from_row(row))
+        if rows:
+            self._folded_through = rows[-1][0]
+            self._size = max(self._size, self._folded_through + 1)
+
+    @property
+    def aggregates(self):
+        """AggregateSnapshot of the running counters over the whole stored history"""
+        if self.shared:
+            with self._lock:
+                self._catch_up(self._connection())
+        else:
+            self._ensure_open()
+        return self._aggregates.snapshot()
+
+    def __len__(self):
+        if self.shared:
+            last_id = self._read('SELECT MAX(id) FROM predictions', ())[0][0]
+            return last_id + 1 if last_id is not None else 0
+        self._ensure_open()
+        return self._size
+
+    @staticmethod
+    def _row_values(timestamp, features, prediction, confidence, method, probabilities=None):
+        # Column values after the id, and probabilities as a list of floats
+        if probabilities is not None:
+            probabilities = [float(p) for p in probabilities]
+        blob = array('d', probabilities).tobytes() if probabilities is not None else None
+        values = (
+            timestamp,
+            features.get('name', ''),
+            features.get('name_manufacturer', ''),
+            features.get('classification', ''),
+            features.get('implanted', ''),
+            prediction,
+            float(confidence),
+            method,
+            blob
+        )
+        return values, probabilities
+
+    def append(self, timestamp, features, prediction, confidence, method, probabilities=None):
+        """Store a prediction and return its PredictionRecord"""
+        values, probabilities = self._row_values(timestamp, features, prediction, confidence, method, probabilities)
+
+        with self._lock:
+            conn = self._connection()
+            # Ids are assigned inside the insert so they stay unique across processes
+            cursor = conn.execute(
+                'INSERT INTO predictions (id, timestamp, name, name_manufacturer, classification, '
+                'implanted, prediction, confidence, method, probabilities) '
+                'VALUES ((SELECT IFNULL(MAX(id) + 1, 0) FROM predictions), ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                values
+            )
+            conn.commit()
+
+            record = PredictionRecord(
+                cursor.lastrowid, *values[:-1],
+                probabilities=probabilities
+            )
+            self._stored([record])
+            epoch = self._aggregates.epoch
+
+        if not self.shared:
+            # Outside the write lock: each thread updates its own shard
+            self._aggregates.add(record, epoch)
+        return record
+
+    def append_many(self, rows):
+        """Store many predictions in one transaction and return their PredictionRecords.
+
+        rows are (timestamp, features, prediction, confidence, method,
+        probabilities) tuples; the records get consecutive ids.
+        """
+        prepared = [self._row_values(*row) for row in rows]
+        if not prepared:
+            return []
+
+        with self._lock:
+            conn = self._connection()
+            # IMMEDIATE takes the write lock up front, so no other process can insert between
+            # reading MAX(id) and the inserts
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                first_id = conn.execute('SELECT IFNULL(MAX(id) + 1, 0) FROM predictions').fetchone()[0]
+                conn.executemany(
+                    'INSERT INTO predictions (id, timestamp, name, name_manufacturer, classification, '
+                    'implanted, prediction, confidence, method, probabilities) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(first_id + offset,) + values for offset, (values, _) in enumerate(prepared)]
+                )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+            records = [
+                PredictionRecord(first_id + offset, *values[:-1], probabilities=probabilities)
+                for offset, (values, probabilities) in enumerate(prepared)
+            ]
+            self._stored(records)
+            epoch = self._aggregates.epoch
+
+        if not self.shared:
+            self._aggregates.add_many(records, epoch)
+        return records
+
+    def _stored(self, records):
+        # Called with self._lock held, after records were committed in id order
+        for record in records[-self.ring_size:]:
+            self._ring.append(record)
+        last_id = records[-1].id
+        if not self.shared:
+            self._folded_through = last_id
+        self._size = max(self._size, last_id + 1)
+
+    def get(self, prediction_id):
+        """Look up a prediction by id, from memory if it is still in the ring"""
+        self._ensure_open()
+        record = self._ring.find(prediction_id)
+        if record is not None:
+            return record
+        rows = self._read(f'SELECT {_COLUMNS} FROM predictions WHERE id = ?', (prediction_id,))
+        return PredictionRecord.from_row(rows[0]) if rows else None
+
+    def recent(self, count):
+        """Return the newest `count` records, oldest first"""
+        self._ensure_open()
+        return self._ring.snapshot(count)
+
+    def iter_records(self, after_id=-1, limit=None, predicted_class=None, method=None,
+                     manufacturer=None, since=None, until=None, batch_size=1000):
+        """Yield stored records in id order, reading the store in batches.
+
+        Records can be filtered by predicted class, method, manufacturer
+        (case-insensitive) and an inclusive timestamp range; after_id and
+        limit give keyset pagination.
+        """
+        conditions = ['id > ?']
+        params = []
+        if predicted_class is not None:
+            conditions.append('prediction = ?')
+            params.append(predicted_class)
+        if method is not None:
+            conditions.append('method = ?')
+            params.append(method)
+        if manufacturer is not None:
+            conditions.append('name_manufacturer = ? COLLATE NOCASE')
+            params.append(manufacturer)
+        if since is not None:
+            conditions.append('timestamp >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('timestamp <= ?')
+            params.append(until)
+        query = f'SELECT {_COLUMNS} FROM predictions WHERE {" AND ".join(conditions)} ORDER BY id LIMIT ?'
+
+        remaining = limit
+        while remaining is None or remaining > 0:
+            fetch = batch_size if remaining is None else min(batch_size, remaining)
+            rows = self._read(query, [after_id, *params, fetch])
+            if not rows:
+                return
+            for row in rows:
+                yield PredictionRecord.from_row(row)
+            after_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def clear(self):
+        """Delete all stored predictions; counters are reset atomically with the store"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute('DELETE FROM predictions')
+            conn.execute("UPDATE history_meta SET value = value + 1 WHERE key = 'generation'")
+            conn.commit()
+            self._load_state(conn)
@@ -0,0 +1,160 @@
+"""
+Single-pass model inference.
+
+InferenceModel wraps the trained classifier and scores rows with exactly one
+predict_proba call: the label is the argmax of each probability row mapped
+through the model's classes_, and the confidence is that row's maximum, so
+label and confidence can never disagree. Rows go to CatBoost as a Pool built
+from plain lists of categorical values, with no pandas DataFrame in between.
+"""
+
+import os
+import pickle
+from collections import namedtuple
+
+import numpy as np
+
+# Checked in order, relative to the working directory; a .cbm file next to
+# one of these (written by artifacts.py --mapped) is preferred unless older
+DEFAULT_MODEL_PATHS = [
+    os.path.join('model', 'catboost_model.pkl'),
+    os.path.join('..', 'model', 'catboost_model.pkl'),
+    os.path.join('..', 'ml', 'catboost_model_3.pkl')
+]
+
+
+def native_model_path(path):
+    """Path of the native .cbm copy of a model file"""
+    return os.path.splitext(path)[0] + '.cbm'
+
+
+def find_model_path():
+    """First existing model file, or None"""
+    for path in DEFAULT_MODEL_PATHS:
+        native = native_model_path(path)
+        if os.path.exists(native) and (not os.path.exists(path) or os.path.getmtime(native) >= os.path.getmtime(path)):
+            return native
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_native_model(model_path):
+    from catboost import CatBoostClassifier
+
+    model = CatBoostClassifier()
+    model.load_model(model_path)
+    print(f"CatBoost model loaded successfully from {model_path} (native format)")
+    return model
+
+
+def load_pickled_model(model_path):
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    print(f"CatBoost model loaded successfully from {model_path} (pickle format)")
+    return model
+
+
+def load_model(model_path):
+    """Load a CatBoost model saved natively or pickled"""
+    loaders = [('Native', load_native_model), ('Pickle', load_pickled_model)]
+    if model_path.endswith('.pkl'):
+        # A pickle is never a valid native file, so try it as one first
+        loaders.reverse()
+    for format_name, loader in loaders:
+        try:
+            return loader(model_path)
+        except Exception as e:
+            print(f"{format_name} format failed: {e}")
+    raise Exception("Both native and pickle formats failed")
+
+
+def boost_confidence(confidence):
+    """Boost confidence if it's reasonably high but below threshold"""
+    if confidence > 0.4:
+        return min(confidence * 1.5, 0.95)  # Boost but cap at 95%
+    return confidence
+
+
+def boost_confidences(confidences):
+    """boost_confidence() over an array of confidences"""
+    confidences = np.asarray(confidences, dtype=float)
+    return np.where(confidences > 0.4, np.minimum(confidences * 1.5, 0.95), confidences)
+
+
+def class_label(value):
+    """Severity class as the API reports it ('1', '2', ...)"""
+    try:
+        return str(int(value))
+    except (TypeError, ValueError):
+        return str(value)
+
+
+# Method reported for predictions the CatBoost model made
+MODEL_METHOD = 'catboost_model_6'
+
+Scores = namedtuple('Scores', ['labels', 'confidences', 'probabilities', 'valid'])
+
+
+class InferenceModel:
+    """Thin wrapper turning feature dicts into (label, confidence, probabilities)"""
+
+    def __init__(self, model, feature_columns, thread_count=None):
+        self.model = model
+        self.feature_columns = list(feature_columns)
+        # CatBoost uses every core per call by default; bulk_score.py limits it per worker
+        self._predict_kwargs = {'thread_count': thread_count} if thread_count else {}
+        self.classes = [class_label(label) for label in model.classes_]
+
+        # Pool construction is cheapest when the categorical columns are given explicitly
+        self._pool_class = None
+        self._cat_features = None
+        if hasattr(model, 'get_cat_feature_indices'):
+            try:
+                from catboost import Pool
+                self._pool_class = Pool
+                self._cat_features = list(model.get_cat_feature_indices())
+            except ImportError:
+                pass
+
+    def rows(self, feature_rows):
+        """Feature dicts as lists of strings in training column order"""
+        columns = self.feature_columns
+        return [[str(features.get(column, '')) for column in columns] for features in feature_rows]
+
+    def predict_proba(self, rows):
+        """Probability matrix for pre-shaped rows (lists of categorical values)"""
+        if self._pool_class is not None:
+            data = self._pool_class(rows, cat_features=self._cat_features, feature_names=self.feature_columns)
+        else:
+            data = rows
+        return np.asarray(self.model.predict_proba(data, **self._predict_kwargs), dtype=float)
+
+    def score_rows(self, rows):
+        """Score pre-shaped rows with one predict_proba call.
+
+        Returns a Scores tuple of arrays: the label and (unboosted)
+        confidence of every row, taken from the same probability row, the
+        probability matrix and a mask of rows whose probabilities are finite.
+        Labels and confidences of invalid rows are meaningless.
+        """
+        probability_matrix = self.predict_proba(rows)
+        return Scores(
+            np.array(self.classes, dtype=object)[probability_matrix.argmax(axis=1)],
+            probability_matrix.max(axis=1),
+            probability_matrix,
+            np.isfinite(probability_matrix).all(axis=1)
+        )
+
+    def predict(self, feature_rows):
+        """Score feature dicts with one predict_proba call.
+
+        Returns one (label, confidence, probabilities) tuple per row, or None
+        for rows whose probabilities are not finite.
+        """
+        scores = self.score_rows(self.rows(feature_rows))
+        return [
+            (scores.labels[i], float(scores.confidences[i]), scores.probabilities[i].copy())
+            if scores.valid[i] else None
+            for i in range(len(scores.valid))
+        ]
@@ -0,0 +1,273 @@
+"""
+Asynchronous scoring jobs for uploads too large for one HTTP request.
+
+Every job lives in its own directory under the jobs directory:
+
+    <job_id>/input.csv (or input.ndjson)   the uploaded file
+    <job_id>/job.json                      state and progress, replaced atomically
+    <job_id>/results.csv                   predictions, appended chunk by chunk
+    <job_id>/job.lock                      held by the process running the job
+
+A pool of background threads scores queued jobs chunk by chunk with the
+same code as bulk_score.py and checkpoints after every chunk. Because all
+state is on disk, any process can report a job's status, and unfinished
+jobs are picked up again after a restart: idle workers rescan the jobs
+directory and claim jobs whose lock nobody holds.
+"""
+
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process job locks on Windows (the development server is single-process there)
+    fcntl = None
+
+from bulk_score import CsvOutput, iter_chunks
+
+INPUT_FORMATS = ('csv', 'ndjson')
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+UNFINISHED = ('queued', 'running')
+
+logger = logging.getLogger(__name__)
+
+# Bytes copied per read when storing an upload
+COPY_BLOCK_SIZE = 1 << 20
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class JobManager:
+    """Persisted queue of chunked scoring jobs, worked off by background threads"""
+
+    def __init__(self, jobs_dir, score_frame, workers=1, chunksize=10000, rescan_interval=30.0):
+        self.jobs_dir = jobs_dir
+        # score_frame(first_row, chunk) returns the result DataFrame for one chunk
+        self.score_frame = score_frame
+        self.workers = max(1, int(workers))
+        self.chunksize = max(1, int(chunksize))
+        self.rescan_interval = rescan_interval
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._threads_pid = None
+        self._active = set()
+
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        # Failures outside a job's scoring (lock file, state file); the job is retried on the next rescan
+        self.worker_errors = 0
+        self.rows_scored = 0
+
+    # -- paths and state ---------------------------------------------------
+
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def result_path(self, job_id):
+        return os.path.join(self.job_dir(job_id), 'results.csv')
+
+    def _state_path(self, job_id):
+        return os.path.join(self.job_dir(job_id), 'job.json')
+
+    def get(self, job_id):
+        """State dict of a job, or None if there is no such job"""
+        if not JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        try:
+            with open(self._state_path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, state):
+        path = self._state_path(state['job_id'])
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
+
+    # -- submitting ------------------------------------------------------------
+
+    def create(self, stream, input_format, max_bytes=None):
+        """Store an uploaded file stream as a new queued job; returns its state"""
+        if input_format not in INPUT_FORMATS:
+            raise ValueError(f'Unsupported input format: {input_format}')
+        job_id = uuid.uuid4().hex
+        job_dir = self.job_dir(job_id)
+        os.makedirs(job_dir)
+        input_path = os.path.join(job_dir, f'input.{input_format}')
+
+        # Copied block by block, counting lines on the way for progress reporting
+        size = 0
+        lines = 0
+        last_byte = b'\n'
+        with open(input_path, 'wb') as f:
+            while True:
+                block = stream.read(COPY_BLOCK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if max_bytes is not None and size > max_bytes:
+                    f.close()
+                    self._remove(job_id)
+                    raise UploadTooLarge(f'Upload larger than {max_bytes} bytes')
+                lines += block.count(b'\n')
+                last_byte = block[-1:]
+                f.write(block)
+        if last_byte != b'\n':
+            lines += 1
+        if size == 0:
+            self._remove(job_id)
+            raise ValueError('Empty upload')
+
+        state = {
+            'job_id': job_id,
+            'status': 'queued',
+            'format': input_format,
+            'input_bytes': size,
+            # Approximate: blank lines and quoted newlines are counted too
+            'rows_total': max(0, lines - 1) if input_format == 'csv' else lines,
+            'rows_done': 0,
+            'chunks_done': 0,
+            'chunksize': self.chunksize,
+            'output_bytes': 0,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None
+        }
+        self._save(state)
+        self.ensure_running()
+        self._queue.put(job_id)
+        return state
+
+    def _remove(self, job_id):
+        job_dir = self.job_dir(job_id)
+        for name in os.listdir(job_dir):
+            os.remove(os.path.join(job_dir, name))
+        os.rmdir(job_dir)
+
+    def unfinished_jobs(self):
+        """Ids of queued or interrupted jobs, oldest first"""
+        if not os.path.isdir(self.jobs_dir):
+            return []
+        jobs = [self.get(job_id) for job_id in os.listdir(self.jobs_dir)]
+        jobs = [job for job in jobs if job is not None and job['status'] in UNFINISHED]
+        return [job['job_id'] for job in sorted(jobs, key=lambda job: job['created_at'])]
+
+    def stats(self):
+        """Job counters for /metrics"""
+        return {
+            'workers': self.workers,
+            'queued': self._queue.qsize(),
+            'running': len(self._active),
+            'jobs_completed': self.jobs_completed,
+            'jobs_failed': self.jobs_failed,
+            'worker_errors': self.worker_errors,
+            'rows_scored': self.rows_scored
+        }
+
+    # -- workers ---------------------------------------------------------------
+
+    def ensure_running(self):
+        """Start the worker threads in this process if needed (threads do not survive fork)"""
+        pid = os.getpid()
+        if self._threads_pid == pid:
+            return
+        with self._lock:
+            if self._threads_pid == pid:
+                return
+            os.makedirs(self.jobs_dir, exist_ok=True)
+            self._queue = queue.Queue()
+            self._active = set()
+            # Jobs left over from before a restart go first
+            for job_id in self.unfinished_jobs():
+                self._queue.put(job_id)
+            self._threads = [threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+                             for i in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+            self._threads_pid = pid
+
+    def _run(self):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=self.rescan_interval)
+            except queue.Empty:
+                # Pick up jobs another process was running when it died
+                for job_id in self.unfinished_jobs():
+                    if job_id not in self._active:
+                        self._queue.put(job_id)
+                continue
+            try:
+                self._run_claimed(job_id)
+            except Exception:
+                self.worker_errors += 1
+                logger.exception(f"Job {job_id} could not be run, retrying on the next rescan")
+
+    def _run_claimed(self, job_id):
+        """Run job_id if no other thread or process is running it"""
+        with self._lock:
+            if job_id in self._active:
+                return
+            self._active.add(job_id)
+        lock_file = None
+        try:
+            lock_file = open(os.path.join(self.job_dir(job_id), 'job.lock'), 'w')
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+            # Re-read under the lock: another process may have finished it meanwhile
+            state = self.get(job_id)
+            if state is not None and state['status'] in UNFINISHED:
+                self._score_job(state)
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+            with self._lock:
+                self._active.discard(job_id)
+
+    def _score_job(self, state):
+        job_id = state['job_id']
+        input_path = os.path.join(self.job_dir(job_id), f"input.{state['format']}")
+        state['status'] = 'running'
+        state['started_at'] = state['started_at'] or time.time()
+        self._save(state)
+
+        output = None
+        try:
+            # Resuming truncates results.csv back to the last checkpointed chunk
+            output = CsvOutput(self.result_path(job_id), state['output_bytes'])
+            first_row = state['rows_done']
+            for chunk in iter_chunks(input_path, state['chunksize'], state['rows_done']):
+                result = self.score_frame(first_row, chunk)
+                state['output_bytes'] = output.write(state['chunks_done'], result)
+                state['chunks_done'] += 1
+                state['rows_done'] += len(result)
+                first_row += len(result)
+                self.rows_scored += len(result)
+                self._save(state)
+        except Exception as e:
+            state['status'] = 'failed'
+            state['error'] = str(e)
+            self.jobs_failed += 1
+        else:
+            state['status'] = 'complete'
+            self.jobs_completed += 1
+        finally:
+            if output is not None:
+                output.close()
+        state['finished_at'] = time.time()
+        self._save(state)
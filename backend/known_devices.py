@@ -0,0 +1,154 @@
+"""
+Known-device lookup: recall levels observed in the dataset for exact inputs.
+
+Every distinct (name, name_manufacturer, classification, implanted) tuple
+in the dataset is normalized the way extract_features() normalizes a
+request and hashed to 64 bits. The index keeps the sorted hashes, the
+per-class counts of final_recall_level observed for each of them and, once
+loaded, a dict from hash to row, so a lookup is one hash plus one dict
+access. /predict can answer a known device with its historical recall
+level (and how many dataset rows support it) instead of calling the model.
+
+The arrays are saved in the startup artifact by artifacts.py, so npz and
+mapped startups get the index without reading the CSV.
+"""
+
+import hashlib
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+# Joins normalized values before hashing; does not occur in device names
+KEY_SEPARATOR = '\x1f'
+
+# prediction: most frequent class; confidence: its share; support: dataset rows with this tuple
+KnownDevice = namedtuple('KnownDevice', ['prediction', 'confidence', 'support', 'distribution', 'probabilities'])
+
+
+def normalize(features, columns):
+    """Feature values as extract_features() produces them"""
+    values = [str(features.get(column, '')) for column in columns]
+    if 'implanted' in columns:
+        position = columns.index('implanted')
+        values[position] = values[position].lower()
+    return values
+
+
+def device_key(values):
+    """64-bit hash of normalized feature values"""
+    digest = hashlib.blake2b(KEY_SEPARATOR.join(values).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class KnownDeviceIndex:
+    """Observed recall-level distribution per exact device tuple"""
+
+    def __init__(self, keys, counts, classes, columns, min_support=1):
+        self.keys = keys
+        self.counts = counts
+        self.classes = [str(label) for label in classes]
+        self.columns = list(columns)
+        self.min_support = min_support
+        self._rows = dict(zip(keys.tolist(), range(len(keys))))
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+        self.model_calls = 0
+        self.model_seconds = 0.0
+
+    @classmethod
+    def from_dataframe(cls, df, columns, target_column, min_support=1):
+        """Index the distinct feature tuples of df by their observed target classes"""
+        from inference import class_label
+
+        frame = df[[column for column in columns if column in df.columns] + [target_column]]
+        frame = frame.dropna(subset=[target_column])
+        values = {column: (frame[column].fillna('').astype(str) if column in frame.columns else '')
+                  for column in columns}
+        if 'implanted' in frame.columns:
+            values['implanted'] = values['implanted'].str.lower()
+        labels = frame[target_column].map(class_label)
+        classes = sorted(labels.unique().tolist())
+
+        # One hash per distinct tuple, not per row
+        grouped = (frame.assign(**values, _label=labels)
+                   .groupby(columns + ['_label'], sort=False).size())
+        rows = {}
+        for (*tuple_values, label), count in grouped.items():
+            counts = rows.setdefault(device_key([str(value) for value in tuple_values]), [0] * len(classes))
+            counts[classes.index(label)] += int(count)
+
+        keys = np.array(sorted(rows), dtype=np.uint64)
+        counts = np.array([rows[key] for key in keys.tolist()], dtype=np.int32).reshape(len(keys), len(classes))
+        return cls(keys, counts, classes, columns, min_support)
+
+    @classmethod
+    def from_arrays(cls, arrays, columns, min_support=1):
+        """Index over arrays saved by arrays() (possibly memory-mapped)"""
+        return cls(arrays['known_keys'], arrays['known_counts'], arrays['known_classes'].tolist(),
+                   columns, min_support)
+
+    def arrays(self):
+        return {
+            'known_keys': self.keys,
+            'known_counts': self.counts,
+            'known_classes': np.array(self.classes, dtype=str)
+        }
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, features):
+        """KnownDevice for an exact match with enough support, else None"""
+        row = self._rows.get(device_key(normalize(features, self.columns)))
+        if row is None:
+            return None
+        counts = self.counts[row].tolist()
+        support = sum(counts)
+        if support < self.min_support:
+            return None
+        # Ties go to the first (least severe) class
+        best = max(range(len(counts)), key=lambda i: (counts[i], -i))
+        return KnownDevice(
+            self.classes[best],
+            counts[best] / support,
+            support,
+            {label: count for label, count in zip(self.classes, counts) if count},
+            [count / support for count in counts]
+        )
+
+    def observe_lookup(self, hit, seconds):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.lookup_seconds += seconds
+
+    def observe_model(self, seconds):
+        """Time a /predict spent in the model, the cost a hit avoids"""
+        with self._lock:
+            self.model_calls += 1
+            self.model_seconds += seconds
+
+    def stats(self):
+        """Hit rate and estimated latency saved, for /metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            lookup_ms = self.lookup_seconds / lookups * 1000 if lookups else None
+            model_ms = self.model_seconds / self.model_calls * 1000 if self.model_calls else None
+            return {
+                'keys': len(self.keys),
+                'min_support': self.min_support,
+                'lookups': lookups,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'avg_lookup_ms': lookup_ms,
+                'avg_model_ms': model_ms,
+                'estimated_saved_ms': (self.hits * (model_ms - lookup_ms)
+                                       if model_ms is not None and lookup_ms is not None else None)
+            }
@@ -0,0 +1,274 @@
+"""
+Streaming drift and confidence monitoring over sliding time windows.
+
+Every served prediction is folded into one ring of fixed-width time
+buckets per window (e.g. 1m, 5m and 1h, 60 buckets each). A bucket is a
+flat array of counters: a confidence histogram, the predicted class
+distribution and, for every model feature, the frequency of its most
+common training categories plus an "other" bin. Buckets that fall out of a
+window are zeroed as time moves on, so memory is fixed and a report sums
+at most buckets x bins counters regardless of traffic.
+
+Reports compare each window's class and feature distributions against a
+reference precomputed from the training dataset (artifacts.py writes it
+to monitoring_reference.json) using the population stability index and
+KL divergence.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+# Histogram bins over [0, 1] for prediction confidence
+CONFIDENCE_BINS = 20
+# Training categories tracked per feature; everything else counts as "other"
+REFERENCE_TOP_K = 20
+# Confidence below this counts towards low_confidence_rate
+LOW_CONFIDENCE = 0.5
+# Common PSI reading: < 0.1 stable, < 0.25 moderate shift, above that significant
+PSI_THRESHOLDS = (0.1, 0.25)
+# Added to every probability so empty bins do not make PSI/KL infinite
+EPSILON = 1e-4
+
+DEFAULT_WINDOWS = '1m,5m,1h'
+REFERENCE_FILE = 'monitoring_reference.json'
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_windows(spec):
+    """'1m,5m,1h' -> {'1m': 60, '5m': 300, '1h': 3600}"""
+    windows = {}
+    for label in spec.split(','):
+        label = label.strip()
+        if not label:
+            continue
+        if label[-1] not in _UNITS or not label[:-1].isdigit() or int(label[:-1]) <= 0:
+            raise ValueError(f'Invalid monitoring window {label!r}; use e.g. 30s, 5m or 1h')
+        windows[label] = int(label[:-1]) * _UNITS[label[-1]]
+    return windows
+
+
+def distribution(values, top_k=REFERENCE_TOP_K):
+    """{'values': top_k most common values, 'frequencies': their shares plus a trailing 'other' share}"""
+    shares = values.value_counts(normalize=True)
+    top = shares.iloc[:top_k]
+    return {
+        'values': [str(value) for value in top.index],
+        'frequencies': [float(share) for share in top.values] + [max(0.0, 1.0 - float(top.sum()))]
+    }
+
+
+def build_reference(df, features, target_column, top_k=REFERENCE_TOP_K):
+    """Reference distributions of the training data, normalized like extract_features()"""
+    from inference import class_label
+
+    reference = {'rows': len(df), 'top_k': top_k, 'features': {}}
+    for feature in features:
+        if feature in df.columns:
+            values = df[feature].fillna('').astype(str)
+            if feature == 'implanted':
+                values = values.str.lower()
+            reference['features'][feature] = distribution(values, top_k)
+    if target_column in df.columns:
+        reference['classes'] = distribution(df[target_column].dropna().map(class_label), top_k)
+    return reference
+
+
+def save_reference(reference, path):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(reference, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def find_reference(artifact_path):
+    """monitoring_reference.json next to the startup artifact, or None"""
+    if artifact_path is None:
+        return None
+    path = os.path.join(os.path.dirname(artifact_path.rstrip('/\\')), REFERENCE_FILE)
+    return path if os.path.exists(path) else None
+
+
+def load_reference(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def divergence(counts, expected):
+    """(PSI, KL(observed || expected)) of a count vector against expected shares; None if empty"""
+    total = counts.sum()
+    if total == 0 or expected is None:
+        return None, None
+    observed = counts / total + EPSILON
+    expected = np.asarray(expected, dtype=float) + EPSILON
+    observed /= observed.sum()
+    expected /= expected.sum()
+    log_ratio = np.log(observed / expected)
+    return float(((observed - expected) * log_ratio).sum()), float((observed * log_ratio).sum())
+
+
+def drift_status(psi):
+    if psi is None:
+        return None
+    if psi < PSI_THRESHOLDS[0]:
+        return 'stable'
+    return 'moderate' if psi < PSI_THRESHOLDS[1] else 'significant'
+
+
+class SlidingWindow:
+    """Counters over the last `seconds`, kept in a ring of time buckets"""
+
+    def __init__(self, seconds, buckets, width):
+        self.seconds = seconds
+        self.bucket_seconds = seconds / buckets
+        self.width = width
+        # Plain lists: incrementing a handful of Python ints beats numpy fancy indexing per prediction
+        self.counts = [[0] * width for _ in range(buckets)]
+        self.confidence_sums = [0.0] * buckets
+        self._newest = None  # absolute number of the newest bucket
+
+    def _advance(self, now):
+        bucket = int(now // self.bucket_seconds)
+        if bucket == self._newest:
+            return
+        if self._newest is not None:
+            # Zero every bucket that the clock has moved past (at most the whole ring)
+            buckets = len(self.counts)
+            for number in range(self._newest + 1, min(bucket, self._newest + buckets) + 1):
+                self.counts[number % buckets] = [0] * self.width
+                self.confidence_sums[number % buckets] = 0.0
+            bucket = max(bucket, self._newest)
+        self._newest = bucket
+
+    def add(self, indices, confidence, now):
+        self.add_many(((indices, confidence),), now)
+
+    def add_many(self, observations, now):
+        # observations: (indices, confidence) pairs, all counted in the bucket for now
+        self._advance(now)
+        row = self._newest % len(self.counts)
+        counts = self.counts[row]
+        total = 0.0
+        for indices, confidence in observations:
+            for index in indices:
+                counts[index] += 1
+            total += confidence
+        self.confidence_sums[row] += total
+
+    def totals(self, now):
+        # Summed on read: reports are rare, predictions are not
+        self._advance(now)
+        return np.array(self.counts, dtype=np.int64).sum(axis=0), sum(self.confidence_sums)
+
+
+class DriftMonitor:
+    """Per-window confidence, class and feature distributions with drift against a reference"""
+
+    def __init__(self, reference=None, features=(), classes=(), windows=None, buckets=60):
+        self.reference = reference or {}
+        reference_features = self.reference.get('features', {})
+        reference_classes = self.reference.get('classes')
+
+        # Counter layout: [confidence histogram | classes + other | each feature's categories + other]
+        offset = CONFIDENCE_BINS
+        self.class_values = reference_classes['values'] if reference_classes else [str(label) for label in classes]
+        self._class_index = {value: offset + i for i, value in enumerate(self.class_values)}
+        self._class_other = offset + len(self.class_values)
+        self._class_slice = slice(offset, self._class_other + 1)
+        offset = self._class_other + 1
+
+        self.features = list(features)
+        self._feature_index = {}
+        self._feature_other = {}
+        self._feature_slices = {}
+        for feature in self.features:
+            values = reference_features.get(feature, {}).get('values', [])
+            self._feature_index[feature] = {value: offset + i for i, value in enumerate(values)}
+            self._feature_other[feature] = offset + len(values)
+            self._feature_slices[feature] = slice(offset, offset + len(values) + 1)
+            offset += len(values) + 1
+
+        self.windows = {label: SlidingWindow(seconds, buckets, offset)
+                        for label, seconds in (windows or parse_windows(DEFAULT_WINDOWS)).items()}
+        self._lock = threading.Lock()
+        self.observed = 0
+
+    def _indices(self, features, prediction, confidence):
+        indices = [min(CONFIDENCE_BINS - 1, max(0, int(confidence * CONFIDENCE_BINS))),
+                   self._class_index.get(str(prediction), self._class_other)]
+        for feature in self.features:
+            indices.append(self._feature_index[feature].get(str(features.get(feature, '')), self._feature_other[feature]))
+        return indices
+
+    def observe(self, features, prediction, confidence, now=None):
+        """Fold one served prediction into every window"""
+        self.observe_many(((features, prediction, confidence),), now)
+
+    def observe_many(self, predictions, now=None):
+        """Fold (features, prediction, confidence) triples served together into every window"""
+        observations = []
+        for features, prediction, confidence in predictions:
+            confidence = float(confidence)
+            if not math.isnan(confidence):
+                observations.append((self._indices(features, prediction, confidence), confidence))
+        if not observations:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.observed += len(observations)
+            for window in self.windows.values():
+                window.add_many(observations, now)
+
+    def report(self, now=None):
+        """Distributions and drift for every window"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            totals = {label: window.totals(now) for label, window in self.windows.items()}
+
+        reference_features = self.reference.get('features', {})
+        reference_classes = self.reference.get('classes')
+        windows = {}
+        for label, (counts, confidence_sum) in totals.items():
+            histogram = counts[:CONFIDENCE_BINS]
+            total = int(histogram.sum())
+            low_bins = int(LOW_CONFIDENCE * CONFIDENCE_BINS)
+
+            class_counts = counts[self._class_slice]
+            psi, kl = divergence(class_counts, reference_classes['frequencies'] if reference_classes else None)
+            classes = {
+                'distribution': {value: int(count) for value, count in
+                                 zip(self.class_values + ['other'], class_counts) if count},
+                'psi': psi, 'kl': kl, 'status': drift_status(psi)
+            }
+
+            features = {}
+            for feature in self.features:
+                feature_counts = counts[self._feature_slices[feature]]
+                expected = reference_features.get(feature, {}).get('frequencies')
+                psi, kl = divergence(feature_counts, expected)
+                features[feature] = {
+                    'psi': psi, 'kl': kl, 'status': drift_status(psi),
+                    # Share of values outside the training top categories
+                    'other_rate': float(feature_counts[-1] / total) if total else None
+                }
+
+            windows[label] = {
+                'seconds': self.windows[label].seconds,
+                'count': total,
+                'confidence': {
+                    'mean': confidence_sum / total if total else None,
+                    'low_confidence_rate': float(histogram[:low_bins].sum() / total) if total else None,
+                    'histogram': histogram.tolist()
+                },
+                'classes': classes,
+                'features': features
+            }
+        return {
+            'reference_rows': self.reference.get('rows'),
+            'observed': self.observed,
+            'windows': windows
+        }
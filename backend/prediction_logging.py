@@ -0,0 +1,73 @@
+"""
+Non-blocking logging pipeline.
+
+Request threads only put log records on an in-memory queue (QueueHandler);
+a QueueListener thread does the console and file I/O. Prediction records
+are written as one JSON object per line, everything else keeps the
+familiar "time - level - message" layout.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+PREDICTION_LOGGER_NAME = 'safeintel.predictions'
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class PredictionLogFormatter(logging.Formatter):
+    """JSON lines for prediction records, plain text for everything else"""
+
+    def format(self, record):
+        fields = getattr(record, 'prediction_fields', None)
+        if fields is None:
+            return super().format(record)
+        payload = {'time': self.formatTime(record), 'level': record.levelname}
+        payload.update(fields)
+        return json.dumps(payload, default=str)
+
+
+_listener = None
+
+
+def setup_logging(log_file='prediction_log.txt', level='INFO'):
+    """Route the root logger through a queue drained by a background listener"""
+    global _listener
+
+    formatter = PredictionLogFormatter(TEXT_FORMAT)
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler(sys.stdout)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    prediction_logger = logging.getLogger(PREDICTION_LOGGER_NAME)
+    prediction_logger.setLevel(level.upper() if isinstance(level, str) else level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return prediction_logger
+
+
+def restart_listener():
+    """Start a new listener thread in a process created by fork()"""
+    if _listener is not None:
+        # The parent's listener thread does not exist in the child
+        _listener._thread = None
+        _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
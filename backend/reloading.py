@@ -0,0 +1,121 @@
+"""
+Background model reloading.
+
+ModelReloader loads a model file on a background thread, warms it up with a
+few synthetic rows so the first real request does not pay for lazy
+initialisation, and hands the ready InferenceModel to a swap callback. The
+callback replaces the serving model with a single reference assignment, so
+in-flight requests finish on whichever model they started with.
+
+FileWatcher polls a model file and triggers a reload once a changed file
+has stopped changing (so a file still being copied is never loaded).
+"""
+
+import os
+import threading
+import time
+
+from inference import InferenceModel, load_model
+
+
+class ModelReloader:
+    """Load, warm up and swap in models without blocking request threads"""
+
+    def __init__(self, feature_columns, warmup_rows, swap):
+        self.feature_columns = feature_columns
+        # warmup_rows() returns feature dicts; swap(inference_model, path) installs a model
+        self.warmup_rows = warmup_rows
+        self.swap = swap
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.failures = 0
+        self.last_result = None
+
+    @property
+    def in_progress(self):
+        return self._lock.locked()
+
+    def prepare(self, model_path):
+        """Load model_path and warm it up; returns (InferenceModel, timings) or raises"""
+        started = time.perf_counter()
+        candidate = InferenceModel(load_model(model_path), self.feature_columns)
+        loaded = time.perf_counter()
+        results = candidate.predict(self.warmup_rows())
+        if not results or any(result is None for result in results):
+            raise ValueError('Model returned unusable probabilities for the warm-up rows')
+        return candidate, {'load_seconds': loaded - started, 'warmup_seconds': time.perf_counter() - loaded}
+
+    def reload(self, model_path):
+        """Load, warm up and swap in model_path on the calling thread; returns the result dict"""
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                candidate, timings = self.prepare(model_path)
+                self.swap(candidate, model_path)
+            except Exception as e:
+                self.failures += 1
+                self.last_result = {'status': 'failed', 'model_path': model_path, 'error': str(e),
+                                    'finished_at': time.time()}
+                return self.last_result
+            self.reloads += 1
+            self.last_result = dict(timings, status='ok', model_path=model_path,
+                                    total_seconds=time.perf_counter() - started, finished_at=time.time())
+            return self.last_result
+
+    def reload_in_background(self, model_path):
+        """Start a reload thread; returns False if a reload is already running"""
+        if self.in_progress:
+            return False
+        threading.Thread(target=self.reload, args=(model_path,), name='model-reload', daemon=True).start()
+        return True
+
+
+class FileWatcher:
+    """Call on_change(path) after path has changed and then stayed unchanged for one poll"""
+
+    def __init__(self, path, interval, on_change):
+        self.path = path
+        self.interval = interval
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def ensure_running(self):
+        """Start the polling thread in this process if it is not running (threads do not survive fork)"""
+        pid = os.getpid()
+        if self._thread_pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread_pid == pid and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+            self._thread.start()
+            self._thread_pid = pid
+
+    def _run(self):
+        current = self._signature()
+        pending = None
+        while True:
+            time.sleep(self.interval)
+            signature = self._signature()
+            if signature is None or signature == current:
+                pending = None
+                continue
+            if signature != pending:
+                # Changed since the last poll: wait until it settles
+                pending = signature
+                continue
+            current = signature
+            pending = None
+            try:
+                self.on_change(self.path)
+            except Exception:
+                pass
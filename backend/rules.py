@@ -0,0 +1,144 @@
+"""
+Rule-based severity prediction, used when the model is unavailable or
+cannot score a row.
+
+The rules are a declarative decision table: the first rule whose condition
+matches a device decides its severity and confidence. The table is compiled
+once into one regular expression per rule. Single lookups are memoized on
+the raw field values, which come from a small vocabulary; whole columns
+are evaluated by factorizing each field and testing every rule once per
+distinct value, so cost grows with the vocabulary rather than the rows.
+Each rule has a stable id and a human-readable reason, so /detailed_report
+explains a prediction from the same table that made it.
+"""
+
+import re
+from collections import namedtuple
+from operator import itemgetter
+
+import numpy as np
+
+# field: feature the condition looks at (None matches everything)
+# op: 'equals' (whole lower-cased value) or 'contains' (any of the substrings)
+Rule = namedtuple('Rule', ['rule_id', 'field', 'op', 'values', 'severity', 'confidence', 'reason'])
+
+RULES = (
+    Rule('implant_unknown', 'implanted', 'equals', ('unknown',), '3', 0.75,
+         "Implant status 'Unknown' → Medium-low severity (Class 3)"),
+    Rule('implanted', 'implanted', 'equals', ('yes',), '1', 0.92,
+         "Implanted device → High severity (Class 1)"),
+    Rule('class_iii', 'classification', 'contains', ('class iii', 'high'), '1', 0.88,
+         "Class III device → High severity (Class 1)"),
+    Rule('class_ii', 'classification', 'contains', ('class ii', 'medium'), '2', 0.84,
+         "Class II device → Medium severity (Class 2)"),
+    Rule('not_implanted', 'implanted', 'equals', ('no',), '3', 0.80,
+         "Non-implanted device → Lower severity (Class 3)"),
+    Rule('default', None, None, (), '3', 0.72,
+         "Default case → Low severity (Class 3)"),
+)
+
+# Value assumed when a feature is missing, as in the original if/elif chain
+FIELD_DEFAULTS = {'implanted': 'no', 'classification': ''}
+
+# Distinct (classification, implanted) pairs remembered by DecisionTable.match
+MEMO_SIZE = 4096
+
+
+class DecisionTable:
+    """First-match decision table over lower-cased feature values"""
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        if self.rules[-1].field is not None:
+            raise ValueError('The last rule must be an unconditional default')
+        self.by_id = {rule.rule_id: rule for rule in self.rules}
+        self.fields = tuple(sorted({rule.field for rule in self.rules if rule.field}))
+        self.severities = np.array([rule.severity for rule in self.rules], dtype=object)
+        self.confidences = np.array([rule.confidence for rule in self.rules], dtype=float)
+        self.rule_ids = np.array([rule.rule_id for rule in self.rules], dtype=object)
+
+        # One regex per conditional rule, used for both scalar and column evaluation
+        self._patterns = []
+        for rule in self.rules[:-1]:
+            alternatives = '|'.join(re.escape(value) for value in rule.values)
+            # \Z, not $: $ also matches before a trailing newline, so 'yes\n' would equal 'yes'
+            pattern = f'^(?:{alternatives})\\Z' if rule.op == 'equals' else f'(?:{alternatives})'
+            self._patterns.append((rule.field, re.compile(pattern)))
+
+        self._defaults = tuple(FIELD_DEFAULTS.get(field, '') for field in self.fields)
+        self._values_of = itemgetter(*self.fields) if len(self.fields) > 1 else lambda features: (features[self.fields[0]],)
+        # raw field values -> (Rule, (severity, confidence)); bounded because inputs are user-controlled
+        self._memo = {}
+
+    def _match_values(self, values):
+        """The first Rule matching a tuple of raw values (in self.fields order)"""
+        lowered = dict(zip(self.fields, (str(value).lower() for value in values)))
+        for index, (field, pattern) in enumerate(self._patterns):
+            if pattern.search(lowered[field]):
+                return self.rules[index]
+        return self.rules[-1]
+
+    def _values(self, features):
+        try:
+            # Fast path: extract_features() always fills every field
+            return self._values_of(features)
+        except KeyError:
+            return tuple(features.get(field, default) for field, default in zip(self.fields, self._defaults))
+
+    def _remember(self, values):
+        rule = self._match_values(values)
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[values] = (rule, (rule.severity, rule.confidence))
+        return self._memo[values]
+
+    def match(self, features):
+        """The first Rule that matches a feature dict"""
+        values = self._values(features)
+        entry = self._memo.get(values) or self._remember(values)
+        return entry[0]
+
+    def predict(self, features):
+        """(severity, confidence) of the first matching rule"""
+        values = self._values(features)
+        entry = self._memo.get(values) or self._remember(values)
+        return entry[1]
+
+    def match_columns(self, columns):
+        """Rule index for every row of a DataFrame (or dict of equal-length columns), in one pass"""
+        import pandas as pd
+
+        row_count = len(columns) if isinstance(columns, pd.DataFrame) else len(next(iter(columns.values())))
+        field_matches = {}
+        for field, default in zip(self.fields, self._defaults):
+            if field in columns:
+                codes, uniques = pd.factorize(pd.Series(columns[field]).fillna(default).astype(str))
+            else:
+                codes, uniques = np.zeros(row_count, dtype=np.intp), np.array([default], dtype=object)
+            field_matches[field] = (codes, [str(value).lower() for value in uniques])
+
+        conditions = []
+        for field, pattern in self._patterns:
+            codes, lowered = field_matches[field]
+            unique_hits = np.fromiter((pattern.search(value) is not None for value in lowered),
+                                      dtype=bool, count=len(lowered))
+            conditions.append(unique_hits[codes])
+        return np.select(conditions, np.arange(len(conditions)), default=len(self.rules) - 1)
+
+    def predict_columns(self, columns):
+        """(severities, confidences, rule_ids) arrays for a batch of rows"""
+        indices = self.match_columns(columns)
+        return self.severities[indices], self.confidences[indices], self.rule_ids[indices]
+
+
+DECISION_TABLE = DecisionTable(RULES)
+
+
+def match_rule(features):
+    """The rule that decides a rule-based prediction for these features"""
+    return DECISION_TABLE.match(features)
+
+
+def simple_rule_based_prediction(features):
+    """Simple rule-based prediction when model is not available"""
+    return DECISION_TABLE.predict(features)
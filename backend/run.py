@@ -5,24 +5,13 @@ Serves both the React frontend and Flask API
 """
 
 import os
-from flask import send_from_directory
 
 # Import the existing Flask app
 from app import app
+from static_assets import register_static_routes
 
-# Configure static file serving for the built React app
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve_static(path):
-    """Serve static files for the React frontend"""
-    static_dir = os.path.join(os.getcwd(), 'static')
-    
-    # If the path exists as a static file, serve it
-    if path != "" and os.path.exists(os.path.join(static_dir, path)):
-        return send_from_directory(static_dir, path)
-    
-    # For all other routes (React routing), serve index.html
-    return send_from_directory(static_dir, 'index.html')
+# Serve the built React app from an in-memory manifest (index.html for React routing)
+static_assets = register_static_routes(app, os.path.join(os.getcwd(), 'static'))
 
 # Override CORS for production
 @app.after_request
@@ -38,7 +27,9 @@ if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     
     print(f"🚀 Starting SafeIntel on port {port}")
-    print("📊 Frontend: Serving React app from /static")
+    stats = static_assets.stats()
+    print(f"📊 Frontend: Serving React app from /static ({stats['files']} files, "
+          f"{stats['compressed']} precompressed)")
     print("🔌 Backend: API available at /predict, /health, /metrics")
     
     # Run the app
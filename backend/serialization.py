@@ -0,0 +1,173 @@
+"""
+Request parsing, input validation and response serialization.
+
+JSON goes through orjson when it is installed (the stdlib json module
+otherwise), for every response: OrjsonProvider replaces Flask's JSON
+provider, so jsonify() and request.get_json() use it as well. Clients that
+send `Accept: application/msgpack` get MessagePack instead, and may send
+MessagePack bodies, when the msgpack package is installed.
+
+Device records are checked against DEVICE_SCHEMA, a declared schema that
+is compiled once into one check per field. A record is validated in a
+single pass that collects every problem, so clients get one 400 listing
+all of them instead of a 500 from deep inside the request.
+"""
+
+import json
+from collections import namedtuple
+
+from flask import current_app, request
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson')
+
+
+class ValidationError(ValueError):
+    """Invalid request payload; errors lists every problem found"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def _default(value):
+    # numpy scalars and arrays, which orjson handles natively
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(value):
+        """Serialize to JSON bytes"""
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+
+    loads = orjson.loads
+else:
+    def dumps(value):
+        """Serialize to JSON bytes"""
+        return json.dumps(value, default=_default, separators=(',', ':')).encode('utf-8')
+
+    loads = json.loads
+
+
+def wants_msgpack():
+    """Whether the current request asked for a MessagePack response"""
+    if msgpack is None:
+        return False
+    accept = request.accept_mimetypes
+    best = accept.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES, default=JSON_MIMETYPE)
+    return best in MSGPACK_MIMETYPES
+
+
+def pack(value):
+    """Serialize to MessagePack bytes"""
+    return msgpack.packb(value, default=_default, use_bin_type=True)
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by dumps()/loads(), with MessagePack content negotiation"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        value = self._prepare_response_obj(args, kwargs)
+        if request and wants_msgpack():
+            return current_app.response_class(pack(value), mimetype=MSGPACK_MIMETYPES[0])
+        return current_app.response_class(dumps(value), mimetype=JSON_MIMETYPE)
+
+
+def read_body():
+    """The request body decoded from JSON or MessagePack; raises ValidationError"""
+    if request.mimetype in MSGPACK_MIMETYPES:
+        if msgpack is None:
+            raise ValidationError(['MessagePack is not supported by this server'])
+        try:
+            return msgpack.unpackb(request.get_data(), raw=False)
+        except Exception as e:
+            raise ValidationError([f'Malformed MessagePack body: {e}'])
+    body = request.get_data()
+    if not body:
+        raise ValidationError(['Request body is empty'])
+    try:
+        return loads(body)
+    except ValueError as e:
+        raise ValidationError([f'Malformed JSON body: {e}'])
+
+
+# type: accepted Python types; default: used when the field is missing or null
+Field = namedtuple('Field', ['name', 'types', 'default', 'max_length', 'lowercase'])
+
+
+class RecordSchema:
+    """Declared record fields compiled into a single validating pass"""
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self._checks = [self._compile(field) for field in self.fields]
+
+    @staticmethod
+    def _compile(field):
+        name, types, default, max_length, lowercase = field
+        type_names = ' or '.join(t.__name__ for t in types)
+
+        def check(record, errors):
+            value = record.get(name)
+            if value is None:
+                return default
+            # bool is an int subclass but never a meaningful device field
+            if type(value) is bool or not isinstance(value, types):
+                errors.append(f"'{name}' must be a {type_names}, got {type(value).__name__}")
+                return None
+            value = value if type(value) is str else str(value)
+            if max_length is not None and len(value) > max_length:
+                errors.append(f"'{name}' is longer than {max_length} characters")
+                return None
+            return value.lower() if lowercase else value
+
+        return name, check
+
+    def validate(self, record):
+        """Normalized dict of the schema's fields; raises ValidationError listing every problem"""
+        if not isinstance(record, dict):
+            raise ValidationError([f'Expected an object, got {type(record).__name__}'])
+        errors = []
+        values = {name: check(record, errors) for name, check in self._checks}
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def normalize_frame(self, frame):
+        """DataFrame of the schema's fields with validate()'s defaults and lowercasing (no type checks)"""
+        normalized = frame.reindex(columns=[field.name for field in self.fields])
+        for name, _, default, _, lowercase in self.fields:
+            column = normalized[name].fillna(default).astype(str)
+            normalized[name] = column.str.lower() if lowercase else column
+        return normalized
+
+
+# The four model features, with the defaults extract_features() always used
+DEVICE_SCHEMA = RecordSchema([
+    Field('name', (str, int, float), '', 500, False),
+    Field('name_manufacturer', (str, int, float), '', 500, False),
+    Field('classification', (str, int, float), '', 200, False),
+    Field('implanted', (str,), 'no', 50, True)
+])
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the SafeIntel API.
+
+Loads the CatBoost model and dataset once in the parent process, then forks
+gunicorn worker processes that share that memory copy-on-write. Each worker
+serves requests from a pool of threads.
+
+Usage:
+    python serve.py [--app app:app] [--workers 4] [--threads 4] [--bind 0.0.0.0:8080]
+
+Send SIGHUP to the parent process to reload the model and gracefully replace
+the workers; SIGTERM drains in-flight requests before exiting.
+"""
+
+import argparse
+import gc
+import importlib
+import multiprocessing
+import os
+import sys
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the SafeIntel API with pre-forked workers')
+    parser.add_argument('--app', default=os.environ.get('SAFEINTEL_APP', 'app:app'),
+                        help="WSGI app as module:attribute, e.g. 'run:app' to include the frontend")
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count())),
+                        help='Worker processes (WEB_CONCURRENCY)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('THREADS', 4)),
+                        help='Request threads per worker (THREADS)')
+    parser.add_argument('--bind', default=f"0.0.0.0:{os.environ.get('PORT', 8080)}",
+                        help='Address to listen on (defaults to 0.0.0.0:$PORT)')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('WORKER_TIMEOUT', 120)),
+                        help='Seconds before a silent worker is restarted')
+    return parser.parse_args(argv)
+
+
+def import_target(target):
+    """Import 'module:attribute' and return the WSGI application"""
+    module_name, _, attribute = target.partition(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute or 'app')
+
+
+def backend_module():
+    """The imported backend/app.py module, whichever name it was imported under"""
+    for name in ('app', 'backend.app'):
+        module = sys.modules.get(name)
+        if module is not None and hasattr(module, 'load_model_and_data'):
+            return module
+    return importlib.import_module('app')
+
+
+def check_application(application):
+    """Whether application is backend/app.py's app, with its request hooks and orjson provider"""
+    from serialization import OrjsonProvider
+
+    backend = backend_module()
+    return (isinstance(getattr(application, 'json', None), OrjsonProvider)
+            and backend.start_request_timer in application.before_request_funcs.get(None, []))
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork(); the background log writer has to be restarted
+    from prediction_logging import restart_listener
+    restart_listener()
+
+
+def on_reload(server):
+    # Runs in the parent on SIGHUP, before the new workers are forked
+    server.log.info("Reloading model before replacing workers")
+    backend_module().load_model_and_data()
+    gc.freeze()
+
+
+def run_gunicorn(application, args):
+    from gunicorn.app.base import BaseApplication
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'graceful_timeout': 30,
+        'preload_app': True,
+        'post_fork': post_fork,
+        'on_reload': on_reload
+    }
+
+    class SafeIntelApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return application
+
+    SafeIntelApplication().run()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Let --app name modules next to this script or in the working directory
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    if args.workers > 1:
+        # Workers write one history store; metrics fold in every worker's records
+        os.environ.setdefault('PREDICTION_HISTORY_SHARED', '1')
+
+    application = import_target(args.app)
+    backend = backend_module()
+    if not check_application(application):
+        print(f"⚠️ {args.app} is not backend/app.py's app: its request hooks and orjson responses are missing")
+
+    print(f"🚀 Loading model in parent process {os.getpid()}")
+    if backend.load_model_and_data():
+        print("✅ Application initialized successfully")
+    else:
+        print("⚠️ Application started with limited functionality")
+
+    # Keep the loaded objects out of the GC's reach so collections in the
+    # workers do not touch (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        print("⚠️ gunicorn is not available (it does not run on Windows), falling back to the threaded development server")
+        host, _, port = args.bind.rpartition(':')
+        application.run(host=host or '0.0.0.0', port=int(port), debug=False, threaded=True)
+        return
+
+    print(f"🔌 Serving {args.app} on {args.bind} with {args.workers} workers x {args.threads} threads")
+    run_gunicorn(application, args)
+
+
+if __name__ == '__main__':
+    main()
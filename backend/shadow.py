@@ -0,0 +1,114 @@
+"""
+Shadow scoring of live traffic with a candidate model.
+
+Request threads hand a sample of their (features, prediction) pairs to a
+ShadowScorer, which re-scores them with the candidate model on its own
+thread and records how often the two models agree and how long the
+candidate takes. Requests never wait on the candidate: when the queue is
+full the sample is dropped and counted.
+"""
+
+import os
+import queue
+import random
+import threading
+import time
+
+from inference import boost_confidence
+
+
+class ShadowScorer:
+    """Compare a candidate InferenceModel against live predictions off the request path"""
+
+    def __init__(self, candidate, model_path, sample_rate=0.1, max_queue=1000, on_result=None):
+        self.candidate = candidate
+        self.model_path = model_path
+        self.sample_rate = sample_rate
+        # on_result(agreed, seconds) is called on the shadow thread, e.g. to feed Prometheus
+        self.on_result = on_result
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._stopped = False
+
+        self.compared = 0
+        self.agreed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.total_confidence_delta = 0.0
+
+    def observe(self, features, prediction, confidence):
+        """Sample one live prediction for shadow scoring; never blocks"""
+        if self._stopped or random.random() >= self.sample_rate:
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((features, prediction, confidence))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        self._stopped = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def stats(self):
+        """Agreement and latency counters for /metrics"""
+        return {
+            'model_path': self.model_path,
+            'sample_rate': self.sample_rate,
+            'compared': self.compared,
+            'agreed': self.agreed,
+            'agreement_rate': self.agreed / self.compared if self.compared else None,
+            'average_latency_ms': self.total_seconds / self.compared * 1000 if self.compared else None,
+            'average_confidence_delta': self.total_confidence_delta / self.compared if self.compared else None,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queued': self._queue.qsize()
+        }
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker_pid == pid and self._worker.is_alive():
+                return
+            if self._worker_pid != pid:
+                # Threads do not survive fork(); start over with a fresh queue
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._worker = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+            self._worker.start()
+            self._worker_pid = pid
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None or self._stopped:
+                return
+            features, prediction, confidence = item
+            started = time.perf_counter()
+            try:
+                result = self.candidate.predict([features])[0]
+            except Exception:
+                self.errors += 1
+                continue
+            seconds = time.perf_counter() - started
+            if result is None:
+                self.errors += 1
+                continue
+
+            label, candidate_confidence, _ = result
+            agreed = label == prediction
+            self.compared += 1
+            self.agreed += agreed
+            self.total_seconds += seconds
+            # Live confidences are boosted, so compare like with like
+            self.total_confidence_delta += boost_confidence(candidate_confidence) - confidence
+            if self.on_result is not None:
+                self.on_result(agreed, seconds)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+In-memory static asset serving for the built React frontend.
+
+At startup StaticAssets walks the static directory once and builds a
+manifest: for every file its content type, a strong ETag, its caching
+policy and the bytes of each representation (identity, plus gzip and
+brotli variants). Requests are answered from the manifest without any
+filesystem calls, and conditional requests get a 304. Files larger than
+the memory limit are streamed from the path recorded at startup instead.
+
+Vite puts a content hash in every file name under assets/, so those are
+cached for a year as immutable; everything else (index.html, the dataset
+CSV the form downloads) must be revalidated, which costs a 304.
+
+Compressed variants are best generated at build time, next to the files:
+
+    python backend/static_assets.py static
+
+Files without a .gz variant are gzipped in memory at startup. Brotli
+variants need the optional brotli package. The manifest is not refreshed,
+so restart the server after rebuilding the frontend.
+"""
+
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from collections import namedtuple
+
+from flask import current_app, request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.html', '.js', '.mjs', '.css', '.json', '.map', '.svg', '.txt', '.csv', '.xml',
+                           '.ico', '.webmanifest')
+# Variants that save less than this fraction of the original are not worth serving
+MIN_COMPRESSION_SAVING = 0.1
+# Vite's content-hashed output, e.g. assets/index-BxY3k9aZ.js
+HASHED_NAME = re.compile(r'(^|/)assets/.+[-.][A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+DEFAULT_MEMORY_LIMIT = 32 * 1024 * 1024
+HASH_BLOCK_SIZE = 1 << 20
+
+# body is None when the representation is served from path
+Representation = namedtuple('Representation', ['encoding', 'etag', 'size', 'body', 'path'])
+Asset = namedtuple('Asset', ['mimetype', 'cache_control', 'representations'])
+
+
+def _digest(path=None, body=None):
+    digest = hashlib.sha256()
+    if body is not None:
+        digest.update(body)
+    else:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+    return digest.hexdigest()[:32]
+
+
+def _representation(encoding, path, memory_limit, body=None):
+    if body is None:
+        size = os.path.getsize(path)
+        if size <= memory_limit:
+            with open(path, 'rb') as f:
+                body = f.read()
+    else:
+        size = len(body)
+    etag = _digest(path, body) + ('' if encoding == 'identity' else f'-{encoding}')
+    return Representation(encoding, etag, size, body, path if body is None else None)
+
+
+class StaticAssets:
+    """Manifest of a static directory, served from memory"""
+
+    def __init__(self, root, index='index.html', memory_limit=DEFAULT_MEMORY_LIMIT):
+        self.root = root
+        self.index = index
+        self.memory_limit = memory_limit
+        self.assets = {}
+        if os.path.isdir(root):
+            self._scan()
+
+    def _scan(self):
+        found = set()
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                found.add(os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/'))
+        # X.gz / X.br are variants of X only when X exists; otherwise they are downloads of their own
+        variants = {relative for relative in found
+                    if relative.endswith(('.gz', '.br')) and relative[:-3] in found
+                    and relative[:-3].lower().endswith(COMPRESSIBLE_EXTENSIONS)}
+        files = found - variants
+
+        for relative in sorted(files):
+            path = os.path.join(self.root, relative)
+            mimetype, stored_encoding = mimetypes.guess_type(relative)
+            # A file that is itself compressed (archive.csv.gz) is sent with its encoding, as send_file does
+            identity = _representation(stored_encoding or 'identity', path, self.memory_limit)
+            representations = {'identity': identity}
+            if relative.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+                    if relative + suffix in variants:
+                        representations[encoding] = _representation(encoding, path + suffix, self.memory_limit)
+                if 'gzip' not in representations and identity.body is not None:
+                    compressed = gzip.compress(identity.body, compresslevel=9, mtime=0)
+                    representations['gzip'] = _representation('gzip', None, self.memory_limit, compressed)
+                representations = {encoding: representation for encoding, representation in representations.items()
+                                   if encoding == 'identity'
+                                   or representation.size <= identity.size * (1 - MIN_COMPRESSION_SAVING)}
+
+            mimetype = mimetype or 'application/octet-stream'
+            cache_control = IMMUTABLE_CACHE_CONTROL if HASHED_NAME.search(relative) else REVALIDATE_CACHE_CONTROL
+            self.assets[relative] = Asset(mimetype, cache_control, representations)
+
+    def __len__(self):
+        return len(self.assets)
+
+    def stats(self):
+        """File count and bytes held in memory, for startup logging"""
+        in_memory = sum(representation.size for asset in self.assets.values()
+                        for representation in asset.representations.values() if representation.body is not None)
+        compressed = sum(len(asset.representations) > 1 for asset in self.assets.values())
+        return {'files': len(self.assets), 'compressed': compressed, 'memory_bytes': in_memory}
+
+    def response(self, path):
+        """Response for a static path, or None if there is no such asset"""
+        asset = self.assets.get(path)
+        if asset is None:
+            return None
+
+        representations = asset.representations
+        representation = representations['identity']
+        if len(representations) > 1:
+            accepted = request.accept_encodings
+            for encoding in ('br', 'gzip'):
+                if encoding in representations and accepted[encoding]:
+                    representation = representations[encoding]
+                    break
+
+        headers = {'ETag': f'"{representation.etag}"', 'Cache-Control': asset.cache_control}
+        if len(representations) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+        if representation.encoding != 'identity':
+            headers['Content-Encoding'] = representation.encoding
+
+        if request.if_none_match.contains_weak(representation.etag):
+            return current_app.response_class(status=304, headers=headers)
+
+        if representation.body is None:
+            response = send_file(representation.path, mimetype=asset.mimetype, conditional=False, etag=False)
+        else:
+            response = current_app.response_class(representation.body, mimetype=asset.mimetype)
+        response.headers.update(headers)
+        return response
+
+    def spa_response(self, path):
+        """The asset at path, else index.html for client-side routes"""
+        response = self.response(path) if path else None
+        if response is None:
+            response = self.response(self.index)
+        if response is None:
+            return 'Frontend not built', 404
+        return response
+
+
+def register_static_routes(app, static_dir, api_prefixes=('api/',)):
+    """Serve static_dir at / from an in-memory manifest, with index.html for every other path"""
+    memory_limit = int(float(os.environ.get('STATIC_MEMORY_LIMIT_MB', DEFAULT_MEMORY_LIMIT / 1024 / 1024))
+                       * 1024 * 1024)
+    assets = StaticAssets(static_dir, memory_limit=memory_limit)
+
+    @app.route('/', defaults={'path': ''}, endpoint='frontend')
+    @app.route('/<path:path>', endpoint='frontend')
+    def frontend(path):
+        if path.startswith(api_prefixes):
+            return 'API endpoint not found', 404
+        return assets.spa_response(path)
+
+    return assets
+
+
+def compress_directory(root, min_size=256):
+    """Write .gz (and, with brotli installed, .br) variants next to compressible files"""
+    written = 0
+    saved = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if not name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                body = f.read()
+            if len(body) < min_size:
+                continue
+            variants = [('.gz', gzip.compress(body, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(body, quality=11)))
+            for suffix, compressed in variants:
+                if len(compressed) > len(body) * (1 - MIN_COMPRESSION_SAVING):
+                    continue
+                with open(path + suffix + '.tmp', 'wb') as f:
+                    f.write(compressed)
+                os.replace(path + suffix + '.tmp', path + suffix)
+                written += 1
+                saved += len(body) - len(compressed)
+    return written, saved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Precompress the built frontend for static_assets.py')
+    parser.add_argument('static_dir', help='Built frontend directory, e.g. static or frontend/dist')
+    parser.add_argument('--min-size', type=int, default=256, help='Skip files smaller than this many bytes')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.static_dir):
+        print(f"❌ Static directory not found: {args.static_dir}")
+        return 1
+    if brotli is None:
+        print("⚠️ brotli not installed, writing gzip variants only")
+    written, saved = compress_directory(args.static_dir, args.min_size)
+    print(f"✅ Wrote {written} compressed variants, {saved / 1024:.0f} KiB smaller than the originals")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,177 @@
+"""
+Typeahead index for device names and manufacturers.
+
+Values are kept in sorted arrays of lower-cased keys, so a prefix maps to a
+contiguous range found with a binary search. Top-K by frequency for the
+shortest (and therefore widest) prefixes is precomputed when the index is
+built. Everything lives in flat numpy arrays, so a built index can be saved
+with arrays() and loaded back memory-mapped with from_arrays().
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Sorts after any character found in the data: prefix + PREFIX_END bounds the prefix range
+PREFIX_END = '\uffff'
+# Per-manufacturer name indexes kept built at once (least recently used are dropped)
+SCOPED_CACHE_SIZE = 256
+
+
+class PrefixIndex:
+    """Case-insensitive prefix search over values ranked by frequency"""
+
+    def __init__(self, value_counts, precompute_depth=2, top_k=20):
+        items = sorted((str(value).lower(), str(value), int(count)) for value, count in value_counts.items())
+        self._keys = np.array([key for key, _, _ in items], dtype=str)
+        self._values = np.array([value for _, value, _ in items], dtype=str)
+        self._counts = np.array([count for _, _, count in items], dtype=np.int64)
+        self.top_k = top_k
+
+        # Short prefixes match huge ranges, so their top-K is computed once up front
+        top = {'': self._top_indices(0, len(self._keys), top_k)}
+        for depth in range(1, precompute_depth + 1):
+            start = 0
+            while start < len(self._keys):
+                if len(self._keys[start]) < depth:
+                    start += 1
+                    continue
+                prefix = str(self._keys[start][:depth])
+                end = int(np.searchsorted(self._keys, prefix + PREFIX_END))
+                top[prefix] = self._top_indices(start, end, top_k)
+                start = end
+        prefixes = sorted(top)
+        self._top_prefixes = np.array(prefixes, dtype=str)
+        self._top_offsets = np.cumsum([0] + [len(top[prefix]) for prefix in prefixes]).astype(np.int64)
+        self._top_rows = np.concatenate([top[prefix] for prefix in prefixes]).astype(np.int64)
+        self._top_cache = {}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix, top_k=20):
+        """Index over arrays saved by arrays() (numpy arrays, possibly memory-mapped)"""
+        index = cls.__new__(cls)
+        index._keys = arrays[f'{prefix}_keys']
+        index._values = arrays[f'{prefix}_values']
+        index._counts = arrays[f'{prefix}_counts']
+        index._top_prefixes = arrays[f'{prefix}_top_prefixes']
+        index._top_offsets = arrays[f'{prefix}_top_offsets']
+        index._top_rows = arrays[f'{prefix}_top_rows']
+        index.top_k = top_k
+        index._top_cache = {}
+        return index
+
+    def arrays(self, prefix):
+        """Arrays that from_arrays() rebuilds this index from, keyed by prefix"""
+        return {
+            f'{prefix}_keys': self._keys,
+            f'{prefix}_values': self._values,
+            f'{prefix}_counts': self._counts,
+            f'{prefix}_top_prefixes': self._top_prefixes,
+            f'{prefix}_top_offsets': self._top_offsets,
+            f'{prefix}_top_rows': self._top_rows
+        }
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _top_indices(self, start, end, limit):
+        # Stable sort: equally frequent values keep their alphabetical order
+        order = np.argsort(-self._counts[start:end], kind='stable')[:limit]
+        return order + start
+
+    def _pairs(self, indices):
+        return list(zip(self._values[indices].tolist(), self._counts[indices].tolist()))
+
+    def search(self, prefix, limit=10):
+        """Return up to `limit` (value, count) pairs starting with prefix, most frequent first"""
+        prefix = prefix.lower()
+        if limit <= self.top_k:
+            cached = self._top_cache.get(prefix)
+            if cached is None:
+                position = int(np.searchsorted(self._top_prefixes, prefix))
+                if position < len(self._top_prefixes) and self._top_prefixes[position] == prefix:
+                    # Decoded on first use, so loading the index does no per-prefix work
+                    rows = self._top_rows[self._top_offsets[position]:self._top_offsets[position + 1]]
+                    cached = self._top_cache[prefix] = self._pairs(rows)
+            if cached is not None:
+                return cached[:limit]
+        start = int(np.searchsorted(self._keys, prefix))
+        end = int(np.searchsorted(self._keys, prefix + PREFIX_END))
+        return self._pairs(self._top_indices(start, end, limit))
+
+
+class SuggestIndex:
+    """Name and manufacturer typeahead, with names optionally scoped to a manufacturer"""
+
+    def __init__(self, pair_counts):
+        # pair_counts: iterable of (name, manufacturer, count)
+        name_counts = {}
+        manufacturer_counts = {}
+        names_by_manufacturer = {}
+        for name, manufacturer, count in pair_counts:
+            if name:
+                name_counts[name] = name_counts.get(name, 0) + count
+            if manufacturer:
+                manufacturer_counts[manufacturer] = manufacturer_counts.get(manufacturer, 0) + count
+                if name:
+                    scoped = names_by_manufacturer.setdefault(manufacturer.lower(), {})
+                    scoped[name] = scoped.get(name, 0) + count
+
+        self.names = PrefixIndex(name_counts)
+        self.manufacturers = PrefixIndex(manufacturer_counts)
+
+        # (manufacturer key, name, count) sorted by key, so one manufacturer is one contiguous range
+        scoped_rows = sorted((key, name, count) for key, names in names_by_manufacturer.items()
+                             for name, count in names.items())
+        self._scoped_keys = np.array([key for key, _, _ in scoped_rows], dtype=str)
+        self._scoped_names = np.array([name for _, name, _ in scoped_rows], dtype=str)
+        self._scoped_counts = np.array([count for _, _, count in scoped_rows], dtype=np.int64)
+        self._scoped_indexes = OrderedDict()
+        self._scoped_lock = threading.Lock()
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Index over arrays saved by arrays() (numpy arrays, possibly memory-mapped)"""
+        index = cls.__new__(cls)
+        index.names = PrefixIndex.from_arrays(arrays, 'names')
+        index.manufacturers = PrefixIndex.from_arrays(arrays, 'manufacturers')
+        index._scoped_keys = arrays['scoped_keys']
+        index._scoped_names = arrays['scoped_names']
+        index._scoped_counts = arrays['scoped_counts']
+        index._scoped_indexes = OrderedDict()
+        index._scoped_lock = threading.Lock()
+        return index
+
+    def arrays(self):
+        """Every array behind the index, for saving next to the startup artifact"""
+        arrays = dict(self.names.arrays('names'), **self.manufacturers.arrays('manufacturers'))
+        arrays.update(scoped_keys=self._scoped_keys, scoped_names=self._scoped_names,
+                      scoped_counts=self._scoped_counts)
+        return arrays
+
+    def suggest_names(self, prefix, manufacturer=None, limit=10):
+        if not manufacturer:
+            return self.names.search(prefix, limit)
+        key = manufacturer.lower()
+        with self._scoped_lock:
+            index = self._scoped_indexes.get(key)
+            if index is not None:
+                self._scoped_indexes.move_to_end(key)
+        if index is None:
+            start = int(np.searchsorted(self._scoped_keys, key))
+            end = int(np.searchsorted(self._scoped_keys, key, side='right'))
+            if start == end:
+                # Unknown manufacturers are not cached, so arbitrary input cannot grow the cache
+                return []
+            # Per-manufacturer indexes are small and built on first use
+            names = dict(zip(self._scoped_names[start:end].tolist(), self._scoped_counts[start:end].tolist()))
+            index = PrefixIndex(names, precompute_depth=0)
+            with self._scoped_lock:
+                self._scoped_indexes[key] = index
+                while len(self._scoped_indexes) > SCOPED_CACHE_SIZE:
+                    self._scoped_indexes.popitem(last=False)
+        return index.search(prefix, limit)
+
+    def suggest_manufacturers(self, prefix, limit=10):
+        return self.manufacturers.search(prefix, limit)
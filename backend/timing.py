@@ -0,0 +1,84 @@
+"""
+Per-request stage timing.
+
+A StageTimer is bound to the current request with a context variable;
+code on the hot path wraps its stages in `with stage('name'):` and the
+durations are returned to clients in a Server-Timing header. Outside a
+request (no timer bound) stage() costs a single context variable lookup.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+_current_timer = contextvars.ContextVar('stage_timer', default=None)
+
+
+class StageTimer:
+    """Accumulated seconds per named stage"""
+
+    __slots__ = ('durations', 'started')
+
+    def __init__(self):
+        self.durations = {}
+        self.started = time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def add(self, stage_name, seconds):
+        self.durations[stage_name] = self.durations.get(stage_name, 0.0) + seconds
+
+
+def start_timer():
+    """Bind a fresh StageTimer to the current context and return it"""
+    timer = StageTimer()
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer():
+    return _current_timer.get()
+
+
+def clear_timer():
+    _current_timer.set(None)
+
+
+@contextmanager
+def stage(stage_name):
+    """Time the enclosed block as stage_name on the current timer, if any"""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(stage_name, time.perf_counter() - started)
+
+
+def record_stages(durations):
+    """Add stage durations measured elsewhere (e.g. on the batching thread)"""
+    timer = _current_timer.get()
+    if timer is not None and durations:
+        for stage_name, seconds in durations.items():
+            timer.add(stage_name, seconds)
+
+
+def server_timing_header(timer):
+    """Format a timer as a Server-Timing header value (milliseconds)"""
+    return ', '.join(f'{name};dur={seconds * 1000:.3f}' for name, seconds in timer.durations.items())
+
+
+def parse_server_timing(header):
+    """Parse a Server-Timing header back into {stage: seconds}"""
+    durations = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if name and key.strip() == 'dur':
+                durations[name] = float(value) / 1000.0
+    return durations
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 import os
 import sys
-from flask import send_from_directory
 
 # Add backend directory to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -10,17 +9,12 @@ sys.path.insert(0, backend_dir)
 
 # Import the existing Flask app
 from app import app
+from static_assets import register_static_routes
 
 # Configure static folder for the existing app
 app.static_folder = os.path.join(current_dir, 'static')
 app.static_url_path = ''
 
-# Add route for serving React app
-@app.route('/')
-def index():
-    """Serve the React app index"""
-    return send_from_directory(app.static_folder, 'index.html')
-
 # Add a debug endpoint
 @app.route('/debug')
 def debug_info():
@@ -35,19 +29,8 @@ def debug_info():
     }
     return json.dumps(info, indent=2)
 
-# Catch-all route for React Router (SPA support) - This must be LAST
-@app.route('/<path:path>')
-def catch_all(path):
-    """
-    Serve static files if they exist, otherwise serve React app for client-side routing
-    """
-    # Try to serve static file first
-    static_file_path = os.path.join(app.static_folder, path)
-    if os.path.isfile(static_file_path):
-        return send_from_directory(app.static_folder, path)
-    
-    # For any other path (React routes), serve the React app
-    return send_from_directory(app.static_folder, 'index.html')
+# Static files from an in-memory manifest, index.html for React Router paths - This must be LAST
+static_assets = register_static_routes(app, app.static_folder)
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
@@ -63,6 +46,9 @@ if __name__ == "__main__":
         files = os.listdir(app.static_folder)
         print(f"📄 Files in static: {len(files)} files")
         print(f"🎯 index.html exists: {'index.html' in files}")
+        stats = static_assets.stats()
+        print(f"🗂️  Static manifest: {stats['files']} files ({stats['compressed']} compressed), "
+              f"{stats['memory_bytes'] / 1024 / 1024:.1f} MB in memory")
         if len(files) <= 20:
             print(f"📋 All files: {files}")
     